@@ -1,12 +1,352 @@
 import pandas as pd
+import numpy as np
 import os
+import io
+import json
+import hashlib
+import shutil
 import concurrent.futures
+from dataloader import frame_to_bars, bars_to_frame, parse_dates, append_bar_cache, seal_bar_cache, reset_bar_cache, read_bar_cache, bar_cache_is_fresh, load_bars, cache_dir
+from resampler import build_pyramid
+from dataquality import check_bars, build_report, repair_bars, write_quality, REPAIRABLE
 
 # Directory containing the files
 data_dir = os.path.join(os.path.dirname(__file__), 'DATA')
 
+# Streaming mode cleans the file chunk by chunk so memory stays flat on multi-GB histories
+STREAMING = True
+CHUNK_SIZE = 64 * 1024 * 1024  # Bytes read from the source file per chunk
+
+# Incremental mode keeps the source exports and on later runs only cleans what the broker appended,
+# the manifest records the size, hash and last processed offset of every source file
+INCREMENTAL = True
+MANIFEST_FILE = os.path.join(data_dir, 'clean_manifest.json')
+HASH_BLOCK = 1024 * 1024  # Bytes hashed at each end of the processed part of a source file
+
+# Files (or appended tails) bigger than this are split into newline-aligned byte ranges cleaned by separate workers
+SPLIT_SIZE = 256 * 1024 * 1024
+WORKERS = os.cpu_count() or 1
+
+# Check every cleaned file for duplicates, bad OHLC rows, spikes and gaps, and optionally repair it
+CHECK_QUALITY = True
+REPAIR_DATA = False
+
+# Also write the compact fixed-point cache (int32 prices and minutes, float32 volume) and its pyramid
+COMPACT_CACHE = False
+
+# Also precompute the M15/H1/H4/D1 bar pyramid under these bin edge conventions ('left' and/or 'right')
+PYRAMID_CONVENTIONS = ['left']
+
+# Column names used for every cleaned file
+COLUMNS = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
+CSV_DECIMALS = 4  # Decimals the prices are written with
+
+# Function to add the Weekday, Price_Change and High_Low_Diff features
+def add_features(data):
+    # Converting the 'Date' column to datetime (fixed-width MT4 parser, pandas for any other format)
+    data['Date'] = parse_dates(data['Date'].to_numpy()).astype('datetime64[ns]')
+
+    # Add the new column for weekday (as numbers)
+    data['Weekday'] = data['Date'].dt.dayofweek + 1  # Adding 1 so Monday=1, Tuesday=2, etc.
+
+    # Add Price_Change and High_Low_Diff features, rounded to 4 decimal places
+    data['Price_Change'] = (data['Close'] - data['Open']).round(4)
+    data['High_Low_Diff'] = (data['High'] - data['Low']).round(4)
+    return data
+
+# Function to read a file in fixed-size chunks and yield blocks of complete lines with '\x00' removed,
+# together with the number of source bytes each block used up
+def iter_clean_blocks(f, chunk_size=CHUNK_SIZE, final_line=True, end=None):
+    carry = b''
+    position = f.tell()
+    while True:
+        # Stop at the end of the byte range when one is given
+        size = chunk_size if end is None else min(chunk_size, end - position)
+        raw = f.read(size) if size > 0 else b''
+        position += len(raw)
+        if not raw:
+            break
+
+        # Keep any partial last line for the next chunk
+        block = carry + raw
+        cut = block.rfind(b'\n') + 1
+        carry = block[cut:]
+        if cut:
+            # Remove the '\x00' bytes
+            yield block[:cut].replace(b'\x00', b''), cut
+
+    # Whatever is left is the last line without a trailing newline, it may still be being written
+    if final_line and carry.replace(b'\x00', b'').strip():
+        yield carry.replace(b'\x00', b''), len(carry)
+
+# Function to round values like '%.4f' prints them, NumPy rounds the values that sit on a tie differently,
+# so those few are formatted one by one
+def round_like_csv(values, decimals=CSV_DECIMALS):
+    rounded = values.round(decimals)
+    scaled = values * 10**decimals
+    with np.errstate(invalid='ignore'):
+        ties = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if ties.any():
+        rounded[ties] = [float(f'{value:.{decimals}f}') for value in values[ties]]
+    return rounded
+
+# Function to write a block of rows to the _C.csv file and return the columns as they read back from it
+def write_block(data, dst, header):
+    buffer = io.StringIO()
+    data.to_csv(buffer, index=False, header=header, float_format=f'%.{CSV_DECIMALS}f', date_format='%Y-%m-%d %H:%M:%S')
+    dst.write(buffer.getvalue())
+
+    # The binary cache gets the columns rounded like the CSV text and typed like read_csv gives them, without parsing the text again
+    bars = frame_to_bars(data)
+    for col, values in bars.items():
+        if values.dtype.kind == 'f':
+            bars[col] = round_like_csv(values)
+        elif values.dtype.kind in 'iu':
+            bars[col] = values.astype(np.int64)
+    return bars
+
+# Function to clean the source from its current position into dst and the binary cache,
+# returns the number of source bytes used and the output columns
+def clean_into(src, dst, csv_path, skip_header, write_header, chunk_size=CHUNK_SIZE, final_line=True, end=None):
+    consumed = 0
+    columns = None
+    for block, used in iter_clean_blocks(src, chunk_size, final_line, end):
+        consumed += used
+
+        # The first line of the export is the header, we use our own column names instead
+        if skip_header:
+            block = block[block.find(b'\n') + 1:] if b'\n' in block else b''
+            skip_header = False
+
+        if block.strip():
+            data = pd.read_csv(io.BytesIO(block), header=None, names=COLUMNS, encoding='latin1')
+            data = add_features(data)
+            append_bar_cache(csv_path, write_block(data, dst, write_header))
+            columns = data.columns
+            write_header = False
+
+    return consumed, columns
+
+# Function to split a byte range of a file into parts that each start right after a newline
+def split_ranges(file_path, start, end, parts):
+    bounds = [start]
+    with open(file_path, 'rb') as f:
+        for part in range(1, parts):
+            position = max(start + (end - start) * part // parts, bounds[-1])
+            f.seek(position)
+
+            # Move forward to just after the next newline
+            while position < end:
+                raw = f.read(64 * 1024)
+                if not raw:
+                    position = end
+                    break
+                newline = raw.find(b'\n')
+                if newline >= 0:
+                    position += newline + 1
+                    break
+                position += len(raw)
+            bounds.append(min(position, end))
+    bounds.append(end)
+    return [(lo, hi) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+
+# Function run by a worker to clean one byte range into its own part CSV and part cache
+def clean_part(args):
+    file_path, lo, hi, part_path, skip_header, chunk_size, final_line = args
+    reset_bar_cache(part_path)
+    with open(file_path, 'rb') as src, open(part_path, 'w', encoding='utf-8', newline='') as dst:
+        src.seek(lo)
+        consumed, columns = clean_into(src, dst, part_path, skip_header, False, chunk_size, final_line, hi)
+    if columns is not None:
+        seal_bar_cache(part_path, columns)
+    return part_path, consumed, None if columns is None else list(columns)
+
+# Function to clean a file from start into dst and the binary cache, splitting big ranges across a process pool
+def clean_file(file_path, dst, csv_path, start, skip_header, write_header, chunk_size=CHUNK_SIZE, final_line=True, workers=1):
+    end = os.path.getsize(file_path)
+    if workers <= 1 or end - start <= SPLIT_SIZE:
+        with open(file_path, 'rb') as src:
+            src.seek(start)
+            return clean_into(src, dst, csv_path, skip_header, write_header, chunk_size, final_line)
+
+    # Each range is cleaned and parsed by a separate worker
+    ranges = split_ranges(file_path, start, end, workers)
+    base_path = os.path.splitext(csv_path)[0]
+    jobs = [(file_path, lo, hi, f'{base_path}.part{i}.csv', skip_header and i == 0, chunk_size, final_line and i == len(ranges) - 1)
+            for i, (lo, hi) in enumerate(ranges)]
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        parts = list(executor.map(clean_part, jobs))
+
+    # Stitch the parts together in order
+    consumed = 0
+    columns = None
+    for part_path, used, part_columns in parts:
+        consumed += used
+        if part_columns is not None:
+            if columns is None:
+                columns = part_columns
+                if write_header:
+                    pd.DataFrame(columns=columns).to_csv(dst, index=False)
+
+            with open(part_path, 'r', encoding='utf-8', newline='') as part:
+                shutil.copyfileobj(part, dst)
+            append_bar_cache(csv_path, read_bar_cache(part_path, mmap_mode='r'))
+
+        os.remove(part_path)
+        shutil.rmtree(cache_dir(part_path), ignore_errors=True)
+
+    return consumed, columns
+
+# Function to get the _C.csv path for a source file
+def output_path(file_path):
+    base_name = os.path.basename(file_path).split('.')[0]
+    return os.path.join(data_dir, f'{base_name}_C.csv')
+
+# Function to clean a file in a single streaming pass straight into the _C.csv file
+def process_file_streaming(file_path, chunk_size=CHUNK_SIZE, keep_source=False, workers=1):
+    new_file_path = output_path(file_path)
+    tmp_file_path = new_file_path + '.tmp'
+
+    # The binary cache is written alongside the CSV, chunk by chunk
+    reset_bar_cache(new_file_path)
+
+    with open(tmp_file_path, 'w', encoding='utf-8', newline='') as dst:
+        consumed, columns = clean_file(file_path, dst, new_file_path, 0, True, True, chunk_size, not keep_source, workers)
+
+    # Only replace the source once the whole file has been written
+    os.replace(tmp_file_path, new_file_path)
+    if not keep_source:
+        os.remove(file_path)
+    if columns is not None:
+        seal_bar_cache(new_file_path, columns)
+
+    print(f"Data cleaned and saved to '{new_file_path}'")
+    return consumed, columns
+
+# Function to hash the processed part of a source file (its first and last HASH_BLOCK bytes)
+def prefix_hash(file_path, offset):
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(min(offset, HASH_BLOCK)))
+        f.seek(max(0, offset - HASH_BLOCK))
+        digest.update(f.read(min(offset, HASH_BLOCK)))
+    return digest.hexdigest()
+
+# Function to clean only what was appended to a source file since the last run, using its manifest entry
+def process_file_incremental(file_path, entry=None, chunk_size=CHUNK_SIZE, workers=1):
+    new_file_path = output_path(file_path)
+    size = os.path.getsize(file_path)
+
+    # The source is an update of the one we processed if the processed part is unchanged
+    is_update = (
+        entry is not None
+        and os.path.exists(new_file_path)
+        and size >= entry['offset']
+        and os.path.getsize(new_file_path) >= entry['output_size']
+        and prefix_hash(file_path, entry['offset']) == entry['hash']
+    )
+
+    if is_update and size == entry['size']:
+        print(f"'{file_path}' is unchanged, skipping")
+        return entry
+
+    if is_update:
+        cache_fresh = bar_cache_is_fresh(new_file_path)
+
+        # Drop anything a crashed earlier run wrote after the last recorded state
+        if os.path.getsize(new_file_path) > entry['output_size']:
+            with open(new_file_path, 'r+b') as f:
+                f.truncate(entry['output_size'])
+
+        # Clean the new tail and append it to the _C.csv file and the binary cache
+        with open(new_file_path, 'a', encoding='utf-8', newline='') as dst:
+            consumed, _ = clean_file(file_path, dst, new_file_path, entry['offset'], False, False, chunk_size, False, workers)
+        offset = entry['offset'] + consumed
+        columns = entry['columns']
+
+        if cache_fresh:
+            seal_bar_cache(new_file_path, columns)
+        else:
+            reset_bar_cache(new_file_path)
+            load_bars(new_file_path)
+        print(f"Appended {consumed} new bytes of '{file_path}' to '{new_file_path}'")
+    else:
+        # New export (or a rewritten one), clean it from the start
+        offset, columns = process_file_streaming(file_path, chunk_size, keep_source=True, workers=workers)
+        columns = columns if columns is not None else []
+
+    return {
+        'size': size,
+        'offset': offset,
+        'hash': prefix_hash(file_path, offset),
+        'output_size': os.path.getsize(new_file_path),
+        'columns': list(columns),
+    }
+
+# Function to load the manifest of processed source files
+def load_manifest():
+    try:
+        with open(MANIFEST_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+# Function to save the manifest of processed source files
+def save_manifest(manifest):
+    tmp_path = MANIFEST_FILE + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MANIFEST_FILE)
+
+# Function to rewrite a _C.csv file and its binary cache from repaired bars
+def rewrite_file(new_file_path, bars):
+    tmp_file_path = new_file_path + '.tmp'
+    data = add_features(bars_to_frame(bars, usecols=COLUMNS))
+
+    reset_bar_cache(new_file_path)
+    with open(tmp_file_path, 'w', encoding='utf-8', newline='') as dst:
+        append_bar_cache(new_file_path, write_block(data, dst, True))
+    os.replace(tmp_file_path, new_file_path)
+    seal_bar_cache(new_file_path, data.columns)
+
+# Function to run the data quality checks on a cleaned file, write the report and gap map, and repair it if asked
+def check_quality(new_file_path):
+    bars = load_bars(new_file_path)
+    flags, gaps = check_bars(bars)
+    report = build_report(bars, flags, gaps)
+
+    if REPAIR_DATA and (flags & REPAIRABLE).any():
+        bars = repair_bars(bars, flags)
+        rewrite_file(new_file_path, bars)
+        flags, gaps = check_bars(bars)
+        report = dict(build_report(bars, flags, gaps), repaired=report['counts'])
+
+    write_quality(new_file_path, report, gaps, flags)
+    problems = ', '.join(f'{name}: {count}' for name, count in report['counts'].items() if count)
+    print(f"Quality of '{new_file_path}': {problems or 'no problems found'}")
+
+# Function to run the steps that follow cleaning on a _C.csv file
+def finish_file(new_file_path):
+    if CHECK_QUALITY:
+        check_quality(new_file_path)
+    for convention in PYRAMID_CONVENTIONS:
+        build_pyramid(new_file_path, convention=convention)
+        if COMPACT_CACHE:
+            build_pyramid(new_file_path, convention=convention, compact=True)
+
 # Function to process and clean the data files
-def process_file(file_path):
+def process_file(file_path, entry=None, workers=1):
+    if STREAMING and INCREMENTAL:
+        result = process_file_incremental(file_path, entry, workers=workers)
+        if result is not entry:
+            finish_file(output_path(file_path))
+            result['output_size'] = os.path.getsize(output_path(file_path))
+        return result
+    if STREAMING:
+        result = process_file_streaming(file_path, workers=workers)
+        finish_file(output_path(file_path))
+        return result
+
     # Read the file as binary
     with open(file_path, 'rb') as f:
         raw_data = f.read()
@@ -25,17 +365,10 @@ def process_file(file_path):
     data = pd.read_csv(file_path)
 
     # Renaming the columns if they have issues
-    data.columns = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
-
-    # Converting the 'Date' column to datetime
-    data['Date'] = pd.to_datetime(data['Date'])
-
-    # Add the new column for weekday (as numbers)
-    data['Weekday'] = data['Date'].dt.dayofweek + 1  # Adding 1 so Monday=1, Tuesday=2, etc.
+    data.columns = COLUMNS
 
-    # Add Price_Change and High_Low_Diff features, rounded to 4 decimal places
-    data['Price_Change'] = (data['Close'] - data['Open']).round(4)
-    data['High_Low_Diff'] = (data['High'] - data['Low']).round(4)
+    # Converting the 'Date' column and adding the features
+    data = add_features(data)
 
     # Save the cleaned DataFrame back to the original file with UTF-8 encoding
     data.to_csv(file_path, index=False, encoding='utf-8', float_format='%.4f')
@@ -45,12 +378,35 @@ def process_file(file_path):
     new_file_path = os.path.join(data_dir, f'{base_name}_C.csv')
     os.rename(file_path, new_file_path)
 
+    # Also emit the binary cache
+    load_bars(new_file_path)
+
     print(f"Data cleaned and saved to '{new_file_path}'")
 
+    finish_file(new_file_path)
+
 if __name__ == "__main__":
     # Get the list of files to process
     file_paths = [os.path.join(data_dir, file_name) for file_name in os.listdir(data_dir) if file_name.endswith('.csv') and '_C' not in file_name]
 
+    # Manifest entries of the files processed on earlier runs
+    manifest = load_manifest()
+    entries = [manifest.get(os.path.basename(file_path)) for file_path in file_paths]
+
+    # Big files are split into byte ranges across all cores one at a time, the rest are processed concurrently
+    big = [i for i, file_path in enumerate(file_paths) if STREAMING and os.path.getsize(file_path) > SPLIT_SIZE]
+    small = [i for i in range(len(file_paths)) if i not in big]
+    results = [None] * len(file_paths)
+
+    for i in big:
+        results[i] = process_file(file_paths[i], entries[i], WORKERS)
+
     # Use ProcessPoolExecutor to process files concurrently
     with concurrent.futures.ProcessPoolExecutor() as executor:
-        executor.map(process_file, file_paths)
\ No newline at end of file
+        for i, result in zip(small, executor.map(process_file, [file_paths[i] for i in small], [entries[i] for i in small])):
+            results[i] = result
+
+    if STREAMING and INCREMENTAL:
+        for file_path, entry in zip(file_paths, results):
+            manifest[os.path.basename(file_path)] = entry
+        save_manifest(manifest)
@@ -1,18 +1,20 @@
 import matplotlib
 matplotlib.use('Agg')  # Set the backend to Agg before importing pyplot
 import matplotlib.pyplot as plt
-import pandas as pd
+import numpy as np
 from matplotlib.patches import Rectangle
 from matplotlib.gridspec import GridSpec
 import platform
 import os
 from datetime import datetime
+from resampler import load_timeframe_frame
+from windowindex import window_bounds, price_range_index
+from dataset import FrameWriter
+from labels import future_labels, LABEL_NAMES
 
 # Determine the operating system and import appropriate module for beep
 if platform.system() == "Windows":
     import winsound
-else:
-    import os
 
 # User-defined variables
 MAIN_BARS_H1 = 300  # Number of bars in the main H1 chart
@@ -24,6 +26,8 @@ CHART_HEIGHT = 500  # Height of the chart in pixels
 SCREENSHOT_DIR = 'DATA/TEST1IMAGES'  # Base directory for saving screenshots
 FUTURE_BARS = 4  # Number of bars to look ahead for price prediction
 SCREENSHOT_START_FRAME = 3000  # Frame number to start capturing screenshots
+OUTPUT_MODE = 'png'  # 'png' saves one screenshot per frame, 'dataset' writes the frames into one memory-mapped file
+DATASET_DIR = 'DATA/TEST1FRAMES'  # Directory of the frame dataset
 
 # Create directories if they don't exist
 for dir_name in ['UP', 'DOWN', 'NEUTRAL']:
@@ -36,36 +40,21 @@ def play_beep():
     else:
         os.system('play -nq -t alsa synth 0.2 sine 1000')  # For Linux/macOS
 
-# Read the CSV file
-df = pd.read_csv('DATA/EURUSD_C.csv', parse_dates=['Date'])
-
-# Sort the dataframe by date
-df = df.sort_values('Date')
-
-# Set the Date column as the index
-df.set_index('Date', inplace=True)
-
-# Resample to 1-hour timeframe
-df_h1 = df.resample('1H', label='right', closed='right').agg({
-    'Open': 'first',
-    'High': 'max',
-    'Low': 'min',
-    'Close': 'last',
-    'Volume': 'sum'
-}).dropna()
-
-# Resample to 5-minute timeframe
-df_m5 = df.resample('5T', label='right', closed='right').agg({
-    'Open': 'first',
-    'High': 'max',
-    'Low': 'min',
-    'Close': 'last',
-    'Volume': 'sum'
-}).dropna()
-
-# Reset index to make Date a column again
-df_h1.reset_index(inplace=True)
-df_m5.reset_index(inplace=True)
+# Read the M5 bars and the H1 bars precomputed from them by the bar pyramid, labelled and closed on the right
+df_h1 = load_timeframe_frame('DATA/EURUSD_C.csv', 'H1', usecols=['Date', 'Open', 'High', 'Low', 'Close', 'Volume'], convention='right')
+df_m5 = load_timeframe_frame('DATA/EURUSD_C.csv', 'M5', usecols=['Date', 'Open', 'High', 'Low', 'Close', 'Volume'], convention='right').dropna()
+df_m5.reset_index(drop=True, inplace=True)
+
+# Positions of the M5 and H1 bars inside the window ending at every M5 bar, computed once so every frame is a positional slice
+m5_starts, m5_stops = window_bounds(df_m5['Date'], df_m5['Date'], 5 * (MAIN_BARS_M5 - 1))
+h1_starts, h1_stops = window_bounds(df_h1['Date'], df_m5['Date'], 60 * MAIN_BARS_H1)
+
+# Lowest and highest price and highest Volume of any of those windows, so plot_data does not scan every frame
+m5_index = price_range_index(df_m5['Open'], df_m5['High'], df_m5['Low'], df_m5['Close'], df_m5['Volume'], max_span=MAIN_BARS_M5)
+h1_index = price_range_index(df_h1['Open'], df_h1['High'], df_h1['Low'], df_h1['Close'], df_h1['Volume'], max_span=MAIN_BARS_H1 + 1)
+
+# Direction of every M5 bar from its close FUTURE_BARS bars later, NEUTRAL at the end of the data
+m5_labels = future_labels(df_m5['Close'].to_numpy(), FUTURE_BARS, PRICE_CHANGE_THRESHOLD, 'close_at_horizon')
 
 # Function to create a single candlestick
 def create_candlestick(ax, row, y_min, y_max):
@@ -90,9 +79,9 @@ def create_volume_bar(ax, row, vol_max):
     rect = Rectangle((row.name - 0.4, 0), 0.8, height, color=color, alpha=0.5)
     ax.add_patch(rect)
 
-def plot_data(price_ax, volume_ax, data):
-    y_min, y_max = data[['Low', 'High']].min().min(), data[['Low', 'High']].max().max()
-    vol_max = data['Volume'].max()
+def plot_data(price_ax, volume_ax, data, index, start, stop):
+    y_min, y_max = index.bounds(start, stop)
+    vol_max = index.volume_max(start, stop)
     
     # Plot candlesticks
     for _, row in data.iterrows():
@@ -109,6 +98,9 @@ def plot_data(price_ax, volume_ax, data):
 # Variable to track if beep has been played
 beep_played = False
 
+# Frame dataset, the figure is rendered at exactly CHART_WIDTH x CHART_HEIGHT pixels
+writer = FrameWriter(DATASET_DIR, len(df_m5) - FUTURE_BARS - SCREENSHOT_START_FRAME, CHART_HEIGHT, CHART_WIDTH) if OUTPUT_MODE == 'dataset' else None
+
 # Function to generate and save a screenshot
 def generate_screenshot(frame):
     global beep_played
@@ -123,31 +115,21 @@ def generate_screenshot(frame):
     ax4 = fig.add_subplot(gs[3, 0], sharex=ax3)  # M5 volume chart
 
     # Calculate data for M5 chart
-    end_time = df_m5['Date'].iloc[frame]
-    start_time_m5 = end_time - pd.Timedelta(minutes=5*(MAIN_BARS_M5-1))
-    main_data_m5 = df_m5[(df_m5['Date'] > start_time_m5) & (df_m5['Date'] <= end_time)].tail(MAIN_BARS_M5)
+    m5_start = max(m5_starts[frame], m5_stops[frame] - MAIN_BARS_M5)
+    main_data_m5 = df_m5.iloc[m5_start:m5_stops[frame]]
     
     # Calculate data for H1 chart
-    start_time_h1 = end_time - pd.Timedelta(hours=MAIN_BARS_H1)
-    main_data_h1 = df_h1[(df_h1['Date'] > start_time_h1) & (df_h1['Date'] <= end_time)]
+    main_data_h1 = df_h1.iloc[h1_starts[frame]:h1_stops[frame]]
     
     # Plot H1 chart
-    plot_data(ax1, ax2, main_data_h1)
+    plot_data(ax1, ax2, main_data_h1, h1_index, h1_starts[frame], h1_stops[frame])
     
     # Plot M5 chart
-    plot_data(ax3, ax4, main_data_m5)
+    plot_data(ax3, ax4, main_data_m5, m5_index, m5_start, m5_stops[frame])
     
-    # Check for significant price change and predict future price
-    current_price = main_data_m5['Close'].iloc[-1]
-    future_price = df_m5['Close'].iloc[frame + FUTURE_BARS] if frame + FUTURE_BARS < len(df_m5) else current_price
-    price_change = (future_price / current_price) - 1
-    
-    # Determine the direction of price movement
-    if abs(price_change) > PRICE_CHANGE_THRESHOLD:
-        if price_change > 0:
-            direction = 'UP'
-        else:
-            direction = 'DOWN'
+    # Direction of price movement
+    direction = LABEL_NAMES[m5_labels[frame]]
+    if direction != 'NEUTRAL':
         if not beep_played:
             play_beep()
             beep_played = True
@@ -163,11 +145,16 @@ def generate_screenshot(frame):
     plt.tight_layout()
     plt.subplots_adjust(left=0, right=1, top=1, bottom=0)
     
-    # Save screenshot
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{timestamp}_{direction}.png"
-    filepath = os.path.join(SCREENSHOT_DIR, direction, filename)
-    fig.savefig(filepath, dpi=dpi, bbox_inches='tight', pad_inches=0)
+    if writer is not None:
+        # Raw RGB pixels of the figure, labelled with the time of the last M5 bar
+        fig.canvas.draw()
+        writer.write(np.asarray(fig.canvas.buffer_rgba())[:, :, :3], direction, df_m5['Date'].iloc[frame])
+    else:
+        # Save screenshot
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"{timestamp}_{direction}.png"
+        filepath = os.path.join(SCREENSHOT_DIR, direction, filename)
+        fig.savefig(filepath, dpi=dpi, bbox_inches='tight', pad_inches=0)
     
     plt.close(fig)
 
@@ -177,4 +164,7 @@ for frame in range(SCREENSHOT_START_FRAME, len(df_m5)-FUTURE_BARS):
     if frame % 100 == 0:
         print(f"Processed frame {frame}/{len(df_m5)-FUTURE_BARS}")
 
+if writer is not None:
+    writer.close()
+
 print("Screenshot generation complete.")
\ No newline at end of file
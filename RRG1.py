@@ -2,40 +2,30 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 import matplotlib.animation as animation
+from dataloader import to_minutes
+from resampler import load_timeframe
+from panel import load_panel
 
 # Load the CSV files
 data_dir = 'DATA2000'  # replace with your actual path
 files = ['EURUSD_C.csv', 'GBPUSD_C.csv', 'USDCHF_C.csv', 'USDJPY_C.csv']
 
-# Function to load data
-def load_data(filename):
-    df = pd.read_csv(f"{data_dir}/{filename}")
-    df['Date'] = pd.to_datetime(df['Date'])
-    df.set_index('Date', inplace=True)
-    return df
-
-# Load the data into dataframes
-dfs = {file.split('_')[0]: load_data(file) for file in files}
-
-# Function to resample data to hourly intervals
-def resample_data(df):
-    df_resampled = df.resample('h').ohlc()
-    df_resampled['Volume'] = df['Volume'].resample('h').sum()
-    df_resampled.columns = ['_'.join(col).strip() for col in df_resampled.columns.values]
-    df_resampled.reset_index(inplace=True)
-    return df_resampled
-
-# Resample data for each dataframe
-for key in dfs:
-    dfs[key] = resample_data(dfs[key])
-
-# Ensure all dataframes have the same time frames
-common_index = dfs['EURUSD'].set_index('Date').index
-for key in dfs:
-    common_index = common_index.intersection(dfs[key].set_index('Date').index)
-
-for key in dfs:
-    dfs[key] = dfs[key][dfs[key]['Date'].isin(common_index)]
+# Function to load the hourly closes, precomputed from M5 by the bar pyramid. The pyramid only has hours with bars,
+# every hour from the first to the last is put back with a NaN close for the empty ones (nights, weekends) like resample('h') gives them
+def load_hourly_closes(file_path):
+    bars = load_timeframe(file_path, 'H1', usecols=['Date', 'Close'])
+    minutes = to_minutes(bars['Date'])
+    hours = np.arange(minutes[0], minutes[-1] + 60, 60) if len(minutes) else minutes
+    closes = np.full(len(hours), np.nan)
+    closes[(minutes - hours[:1]) // 60] = bars['Close']
+    return {'Date': hours.astype('datetime64[m]'), 'Close_close': closes}
+
+# Load the hourly data for each pair concurrently, aligned once on the hours every pair has
+symbols, panel = load_panel([f"{data_dir}/{file}" for file in files], fields=['Close_close'], policy='intersect',
+                            loader=load_hourly_closes)
+common_index = pd.DatetimeIndex(panel['Date'].astype('datetime64[ns]'))
+
+dfs = {key: pd.DataFrame({'Date': common_index, 'Close_close': panel['Close_close'][i]}) for i, key in enumerate(symbols)}
 
 # Function to calculate RS-Ratio and RS-Momentum
 def calculate_rs(df):
@@ -2,7 +2,9 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
-import os
+from dataloader import load_frame, load_bars, frame_to_bars, bars_to_frame
+from panel import load_panel, find_bar_files
+from resampler import load_timeframe_frame, timeframe_of, rule_minutes, resample_bars
 
 # Define the time frame and the tail length
 time_frame = '1h'  # Change this to '5T', '1h', '1D', etc. ME
@@ -19,7 +21,12 @@ colors = {
 
 # Function to read and resample data
 def read_and_resample(file_path, time_frame):
-    df = pd.read_csv(file_path, parse_dates=['Date'], index_col='Date')
+    # Timeframes of the bar pyramid are precomputed, other fixed-length rules are resampled with NumPy, calendar rules with pandas
+    if timeframe_of(time_frame) is not None:
+        return load_timeframe_frame(file_path, timeframe_of(time_frame), usecols=['Open', 'High', 'Low', 'Close', 'Volume'], index_col='Date')
+    if rule_minutes(time_frame) is not None:
+        return bars_to_frame(resample_bars(load_bars(file_path), rule_minutes(time_frame)), index_col='Date')
+    df = load_frame(file_path, index_col='Date')
     resampled_df = df.resample(time_frame).agg({'Open': 'first', 
                                                 'High': 'max', 
                                                 'Low': 'min', 
@@ -27,22 +34,20 @@ def read_and_resample(file_path, time_frame):
                                                 'Volume': 'sum'}).dropna()
     return resampled_df
 
-# Read data for each currency pair
+# Read data for each currency pair, concurrently, aligned once onto the times every pair has a bar for
 data_directory = './DATA'
-currency_pairs = [f for f in os.listdir(data_directory) if f.endswith('_C.csv')]
+file_paths = find_bar_files(data_directory)
 
-data = {}
-for pair in currency_pairs:
-    pair_name = pair.split('_')[0]
-    file_path = os.path.join(data_directory, pair)
-    data[pair_name] = read_and_resample(file_path, time_frame)
+symbols, panel = load_panel(file_paths, fields=['Close'], policy='intersect',
+                            loader=lambda file_path: frame_to_bars(read_and_resample(file_path, time_frame).reset_index()))
+data = pd.DataFrame(panel['Close'].T, index=pd.DatetimeIndex(panel['Date'].astype('datetime64[ns]'), name='Date'), columns=symbols)
 
 # Calculate Relative Strength (RS)
 def calculate_rs(data, benchmark):
     rs = {}
     for pair in data:
         if pair != benchmark:
-            rs[pair] = data[pair]['Close'] / data[benchmark]['Close']
+            rs[pair] = data[pair] / data[benchmark]
     return rs
 
 # Calculate RS-Ratio and RS-Momentum
@@ -128,7 +133,7 @@ def update_graph(num, rs_ratio, rs_momentum, dates, tail_length):
 benchmark = 'EURUSD'
 rs = calculate_rs(data, benchmark)
 rs_ratio, rs_momentum = calculate_rrg_components(rs)
-dates = data[benchmark].index
+dates = data.index
 
 # Event handler to close the animation gracefully
 def on_close(event):
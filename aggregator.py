@@ -0,0 +1,110 @@
+import numpy as np
+from dataloader import bars_to_frame, to_minutes
+from resampler import TIMEFRAMES, CONVENTION, CONVENTIONS, resample_bars, rule_minutes
+
+# Function to turn one bar dict into a one-row DataFrame indexed by Date
+def bar_frame(bar):
+    return bars_to_frame({col: np.asarray([value]) for col, value in bar.items()}, index_col='Date')
+
+class BarAggregator:
+    def __init__(self, timeframes=('H1',), convention=CONVENTION, bar_minutes=5):
+        if convention not in CONVENTIONS:
+            raise ValueError(f"Unknown bin edge convention '{convention}', use one of {CONVENTIONS}")
+        self.convention = convention
+        self.bar_minutes = bar_minutes  # Length of the bars fed in, 0 for ticks
+        self.minutes = {timeframe: self._timeframe_minutes(timeframe) for timeframe in timeframes}
+        self.forming = {timeframe: None for timeframe in timeframes}
+        self.last_closed = {timeframe: None for timeframe in timeframes}
+        self.origin = None
+
+    def _timeframe_minutes(self, timeframe):
+        minutes = TIMEFRAMES.get(timeframe) or rule_minutes(timeframe)
+        if minutes is None:
+            raise ValueError(f"Unknown timeframe '{timeframe}', use one of {list(TIMEFRAMES)} or a fixed-length pandas rule")
+        return minutes
+
+    # Label of the bin a minute falls in, bins are counted from midnight of the first day like resample_bars does
+    def _label(self, minute, bin_minutes):
+        offset = minute - self.origin
+        if self.convention == 'left':
+            return self.origin + offset // bin_minutes * bin_minutes
+        return self.origin + -(-offset // bin_minutes) * bin_minutes
+
+    # A bin is complete once a bar reaches its end, ticks only close a bin when the next bin starts
+    def _is_complete(self, label, minute, bin_minutes):
+        if not self.bar_minutes:
+            return False
+        if self.convention == 'left':
+            return minute + self.bar_minutes >= label + bin_minutes
+        return minute >= label
+
+    def _close(self, timeframe):
+        bar = self.forming[timeframe]
+        self.forming[timeframe] = None
+        self.last_closed[timeframe] = bar['Date']
+        return timeframe, bar
+
+    def seed(self, bars):
+        # Start from a block of past bars in one vectorized pass, returns the closed bars of every timeframe
+        if self.origin is not None:
+            raise ValueError("seed has to come before the first update")
+        minutes = to_minutes(bars['Date'])
+        if len(minutes):
+            self.origin = int(minutes[0]) // 1440 * 1440
+
+        closed = {}
+        for timeframe, bin_minutes in self.minutes.items():
+            resampled = resample_bars(bars, bin_minutes, self.convention)
+            if len(minutes) and len(resampled['Date']):
+                # The bin of the last bar keeps forming unless the last bar completed it
+                label = self._label(int(minutes[-1]), bin_minutes)
+                last = resampled['Date'][-1]
+                if to_minutes(last) == label and not self._is_complete(label, int(minutes[-1]), bin_minutes):
+                    self.forming[timeframe] = {col: values[-1] for col, values in resampled.items()}
+                    resampled = {col: values[:-1] for col, values in resampled.items()}
+                if len(resampled['Date']):
+                    self.last_closed[timeframe] = resampled['Date'][-1]
+            closed[timeframe] = resampled
+        return closed
+
+    def update(self, date, open_, high, low, close, volume=0):
+        # Add one bar, O(1) per timeframe, returns the (timeframe, bar) pairs this bar closed
+        minute = int(to_minutes(np.datetime64(date, 'm')))
+        if self.origin is None:
+            self.origin = minute // 1440 * 1440
+
+        closed = []
+        for timeframe, bin_minutes in self.minutes.items():
+            label = self._label(minute, bin_minutes)
+            date_label = np.datetime64(label, 'm')
+            bar = self.forming[timeframe]
+            if (bar is not None and date_label < bar['Date']) or (self.last_closed[timeframe] is not None and date_label <= self.last_closed[timeframe]):
+                raise ValueError(f"Bar at {date} belongs to a {timeframe} bar that is already closed")
+
+            if bar is not None and date_label != bar['Date']:
+                closed.append(self._close(timeframe))
+                bar = None
+
+            if bar is None:
+                self.forming[timeframe] = {'Date': date_label, 'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume}
+            else:
+                bar['High'] = max(bar['High'], high)
+                bar['Low'] = min(bar['Low'], low)
+                bar['Close'] = close
+                bar['Volume'] += volume
+
+            if self._is_complete(label, minute, bin_minutes):
+                closed.append(self._close(timeframe))
+        return closed
+
+    def update_tick(self, date, price, volume=0):
+        return self.update(date, price, price, price, price, volume)
+
+    def forming_bar(self, timeframe):
+        # The still forming bar of a timeframe, None right after a bar closed
+        bar = self.forming[timeframe]
+        return dict(bar) if bar is not None else None
+
+    def flush(self):
+        # Close every forming bar, e.g. at the end of the data
+        return [self._close(timeframe) for timeframe in self.forming if self.forming[timeframe] is not None]
@@ -0,0 +1,104 @@
+import os
+import csv
+import heapq
+import itertools
+from dataloader import detect_encoding
+
+# Files to combine, all sorted by Date, listed in priority order (first = highest)
+input_files = ['DATA - 2000/EURUSD_C.csv', 'DATA/EURUSD_C.csv']
+output_file = 'DATA - Combined/EURUSD_C.csv'
+
+# Which bar to keep when several files have the same timestamp:
+# 'first' = the file listed first, 'last' = the file listed last, 'volume' = the bar with the highest Volume
+PRIORITY_RULE = 'first'
+
+# Function to turn a Date value into a key that sorts correctly as text ('YYYY.MM.DD HH:MM' or 'YYYY-MM-DD HH:MM:SS'),
+# the key is also the Date written out, in the 'YYYY-MM-DD HH:MM:SS' layout of the cleaned files
+def date_key(value):
+    value = value.strip().replace('.', '-').replace('/', '-')
+    if len(value) == 16:
+        value += ':00'
+    return value
+
+# Function to open a bar file as text, cleaned files and raw (UTF-16 or plain) exports alike
+def open_bar_file(file_path):
+    with open(file_path, 'rb') as f:
+        head = f.read(4096)
+    return open(file_path, 'r', encoding=detect_encoding(head), newline='')
+
+# Function to read the header of a bar file
+def read_header(file_path):
+    with open_bar_file(file_path) as f:
+        return next(csv.reader(line.replace('\x00', '') for line in f))
+
+# Function to stream the rows of one file as (key, file index, row), in the column order of the output
+def read_rows(file_path, file_index, columns):
+    with open_bar_file(file_path) as f:
+        # Any stray '\x00' of a plain export is removed
+        reader = csv.reader(line.replace('\x00', '') for line in f)
+        header = next(reader)
+        missing = [col for col in columns if col not in header]
+        if missing:
+            raise ValueError(f"'{file_path}' has no {', '.join(missing)} column")
+        positions = [header.index(col) for col in columns]
+        date_pos = header.index('Date')
+
+        previous = ''
+        for row in reader:
+            if not row:
+                continue
+            key = date_key(row[date_pos])
+            if key < previous:
+                raise ValueError(f"'{file_path}' is not sorted by Date ({key} comes after {previous})")
+            previous = key
+            yield key, file_index, [key if pos == date_pos else row[pos] for pos in positions]
+
+# Function to pick the bar to keep out of several bars with the same timestamp
+def pick_bar(bars, rule, volume_pos):
+    if rule == 'first':
+        return min(bars, key=lambda bar: bar[1])
+    if rule == 'last':
+        return max(bars, key=lambda bar: bar[1])
+    if rule == 'volume':
+        # Highest volume, the earlier file wins a tie
+        return max(bars, key=lambda bar: (float(bar[2][volume_pos] or 0), -bar[1]))
+    raise ValueError(f"Unknown priority rule '{rule}'")
+
+# Function to merge any number of sorted bar files into one sorted file without duplicate timestamps
+def combine_files(file_paths, output_path, rule=PRIORITY_RULE):
+    # The output has the columns every file has, in the order of the first file, so a raw export
+    # (without Weekday, Price_Change and High_Low_Diff) merges with cleaned files on the bar columns
+    headers = [read_header(file_path) for file_path in file_paths]
+    for file_path, header in zip(file_paths, headers):
+        if 'Date' not in header:
+            raise ValueError(f"'{file_path}' has no Date column, its header is {header}")
+    columns = [col for col in headers[0] if all(col in header for header in headers[1:])]
+    dropped = [col for col in headers[0] if col not in columns]
+    if dropped:
+        print(f"Columns not in every file are left out: {', '.join(dropped)}")
+    volume_pos = columns.index('Volume') if 'Volume' in columns else None
+    if rule == 'volume' and volume_pos is None:
+        raise ValueError("The 'volume' rule needs a Volume column")
+
+    streams = [read_rows(file_path, i, columns) for i, file_path in enumerate(file_paths)]
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    tmp_path = output_path + '.tmp'
+    written, duplicates = 0, 0
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, lineterminator=os.linesep)
+        writer.writerow(columns)
+
+        # k-way merge, only one row per input file is held in memory at a time
+        merged = heapq.merge(*streams, key=lambda bar: (bar[0], bar[1]))
+        for _, group in itertools.groupby(merged, key=lambda bar: bar[0]):
+            bars = list(group)
+            duplicates += len(bars) - 1
+            writer.writerow(pick_bar(bars, rule, volume_pos)[2])
+            written += 1
+
+    os.replace(tmp_path, output_path)
+    print(f"Combined {len(file_paths)} files into '{output_path}': {written} bars, {duplicates} duplicates resolved with rule '{rule}'")
+
+if __name__ == "__main__":
+    combine_files(input_files, output_file)
@@ -0,0 +1,375 @@
+import io
+import os
+import json
+import struct
+import numpy as np
+import pandas as pd
+
+# Column names used for every bar file
+COLUMNS = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
+
+# Types for the bar columns, any other column keeps the type pandas gives it
+BAR_DTYPES = {
+    'Date': 'datetime64[m]',
+    'Open': np.float64,
+    'High': np.float64,
+    'Low': np.float64,
+    'Close': np.float64,
+    'Volume': np.int64,
+}
+
+# Binary cache settings, one .npy file per column in CACHE/<file name>/ next to the CSV
+CACHE_DIR_NAME = 'CACHE'
+CACHE_META = 'meta.json'
+NPY_HEADER_SIZE = 128  # Fixed header size so columns can be appended to in place
+
+# Compact fixed-point form: prices as int32 multiples of 1/scale, minutes since 1970 as int32, float32 volume
+PRICE_SCALE = 100000
+JPY_PRICE_SCALE = 1000
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Price_Change', 'High_Low_Diff']
+COMPACT_DTYPES = {
+    'Date': np.int32,
+    'Price': np.int32,
+    'Volume': np.float32,
+    'Weekday': np.int8,
+}
+COMPACT_VARIANT = 'compact'
+
+# Function to work out the text encoding of an export from its first bytes
+def detect_encoding(head):
+    # Byte order marks
+    if head.startswith(b'\xef\xbb\xbf'):
+        return 'utf-8-sig'
+    if head.startswith(b'\xff\xfe') or head.startswith(b'\xfe\xff'):
+        return 'utf-16'
+
+    # No BOM, ASCII text stored as UTF-16 has a '\x00' in every other byte
+    sample = head[:4096]
+    if len(sample) >= 2:
+        even_zeros = sample[0::2].count(0)
+        odd_zeros = sample[1::2].count(0)
+        half = len(sample) // 2
+        if odd_zeros > half * 0.4 and even_zeros == 0:
+            return 'utf-16-le'
+        if even_zeros > half * 0.4 and odd_zeros == 0:
+            return 'utf-16-be'
+    return 'latin1'
+
+# Positions of the digits in a fixed-width timestamp
+FIXED_DATE_DIGITS = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15]
+
+# Function to parse fixed-width 'YYYY.MM.DD HH:MM' (or 'YYYY-MM-DD HH:MM:SS') timestamps with byte arithmetic,
+# returns None when the values are not in that layout
+def parse_fixed_dates(values):
+    raw = np.asarray(values)
+    if raw.dtype.kind == 'M':
+        return raw.astype('datetime64[m]')
+    if len(raw) == 0:
+        return raw.astype('datetime64[m]')
+    if raw.dtype.kind in 'OU':
+        try:
+            raw = raw.astype('S')
+        except (UnicodeEncodeError, ValueError, TypeError):
+            return None
+    if raw.dtype.kind != 'S' or raw.dtype.itemsize not in (16, 19):
+        return None
+
+    # One row of ASCII codes per timestamp
+    chars = np.ascontiguousarray(raw).view(np.uint8).reshape(len(raw), raw.dtype.itemsize)
+
+    # Check the separators, the date ones have to be the same on every row
+    date_sep = chars[0, 4]
+    if date_sep not in b'.-/':
+        return None
+    if not ((chars[:, 4] == date_sep).all() and (chars[:, 7] == date_sep).all()
+            and (chars[:, 10] == ord(' ')).all() and (chars[:, 13] == ord(':')).all()):
+        return None
+
+    if raw.dtype.itemsize == 19:
+        # Seconds must be ':00', bars are on whole minutes
+        if not ((chars[:, 16] == ord(':')).all() and (chars[:, 17] == ord('0')).all() and (chars[:, 18] == ord('0')).all()):
+            return None
+
+    # Digits as 0-9, anything else wraps around to a value above 9
+    digits = chars[:, FIXED_DATE_DIGITS] - np.uint8(ord('0'))
+    if (digits > 9).any():
+        return None
+
+    # One contiguous row per digit position, then the fields
+    d = np.ascontiguousarray(digits.T).astype(np.int32)
+    year = d[0] * 1000 + d[1] * 100 + d[2] * 10 + d[3]
+    month = d[4] * 10 + d[5]
+    day = d[6] * 10 + d[7]
+    hour = d[8] * 10 + d[9]
+    minute = d[10] * 10 + d[11]
+    if ((month < 1) | (month > 12) | (day < 1) | (hour > 23) | (minute > 59)).any():
+        return None
+
+    # Small table of the first day of every month in the range, NumPy does the calendar part
+    months = (year - 1970) * 12 + month - 1
+    first_month = months.min()
+    month_days = np.arange(first_month, months.max() + 2).astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    months -= first_month
+    days = month_days[months]
+    if (day > month_days[months + 1] - days).any():
+        return None
+
+    return ((days + (day - 1)) * 1440 + (hour * 60 + minute)).astype('datetime64[m]')
+
+# Function to parse a Date column, the fixed-width parser first and pandas for any other format,
+# raises ValueError for timestamps that are not on whole minutes instead of cutting off their seconds
+def parse_dates(values):
+    parsed = parse_fixed_dates(values)
+    if parsed is None:
+        exact = pd.to_datetime(pd.Series(values)).to_numpy(dtype='datetime64[ns]')
+        parsed = exact.astype('datetime64[m]')
+        off_minute = ~np.isnat(exact) & (exact != parsed)
+        if off_minute.any():
+            first = np.flatnonzero(off_minute)[0]
+            raise ValueError(f"{int(off_minute.sum())} timestamps are not on whole minutes, the first is '{np.asarray(values)[first]}' in row {first}")
+    return parsed
+
+# Function to convert the parsed DataFrame columns into typed NumPy arrays
+def frame_to_bars(data):
+    bars = {}
+    for col in data.columns:
+        if col in BAR_DTYPES:
+            bars[col] = data[col].to_numpy(dtype=BAR_DTYPES[col])
+        else:
+            bars[col] = data[col].to_numpy()
+    return bars
+
+# Function to read a raw broker export (UTF-16 or plain) straight into NumPy columns
+def read_mt4_export(file_path):
+    with open(file_path, 'rb') as f:
+        raw_data = f.read()
+
+    # Decode once with the right codec, no '\x00' clean-up or rewrite needed
+    encoding = detect_encoding(raw_data[:4096])
+    text = raw_data.decode(encoding)
+    del raw_data
+
+    # Any stray '\x00' left by a plain export is still removed here
+    if encoding == 'latin1' and '\x00' in text:
+        text = text.replace('\x00', '')
+
+    # The first line is the header, we use our own column names instead
+    data = pd.read_csv(io.StringIO(text), header=0, names=COLUMNS)
+    del text
+
+    # MT4 layout first, fall back to letting pandas work out the format
+    data['Date'] = parse_dates(data['Date'].to_numpy())
+
+    return frame_to_bars(data)
+
+# Function to read a cleaned _C.csv file (or a raw UTF-16 export) into NumPy columns
+def read_csv_bars(file_path):
+    with open(file_path, 'rb') as f:
+        head = f.read(4096)
+    if detect_encoding(head).startswith('utf-16'):
+        return read_mt4_export(file_path)
+
+    data = pd.read_csv(file_path)
+    data['Date'] = parse_dates(data['Date'].to_numpy())
+    return frame_to_bars(data)
+
+# Function to turn a dict of bar columns into a DataFrame like pd.read_csv(parse_dates=['Date']) gives
+def bars_to_frame(bars, usecols=None, index_col=None):
+    # Keep the file column order like read_csv does
+    columns = [col for col in bars if usecols is None or col in usecols or col == index_col]
+
+    data = pd.DataFrame({col: bars[col] for col in columns})
+    if 'Date' in data:
+        data['Date'] = data['Date'].astype('datetime64[ns]')
+    if index_col is not None:
+        data.set_index(index_col, inplace=True)
+    return data
+
+# Function to get the cache directory for a CSV file, variants (like the compact copy) get their own directory
+def cache_dir(csv_path, variant=''):
+    base_name = os.path.splitext(os.path.basename(csv_path))[0]
+    if variant:
+        base_name = f'{base_name}.{variant}'
+    return os.path.join(os.path.dirname(os.path.abspath(csv_path)), CACHE_DIR_NAME, base_name)
+
+# Function to get the key the cache is checked against (size and modification time of the CSV)
+def source_key(csv_path):
+    stat = os.stat(csv_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+# Function to build a .npy header padded to a fixed size, so the shape can be rewritten in place,
+# item_shape is the shape of every row for arrays with more than one dimension
+def npy_header(dtype, length, item_shape=()):
+    shape = (int(length),) + tuple(int(size) for size in item_shape)
+    header = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (np.lib.format.dtype_to_descr(np.dtype(dtype)), shape)
+    header = header.ljust(NPY_HEADER_SIZE - 10 - 1) + '\n'
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1')
+
+# Function to delete the cache of a CSV file
+def reset_bar_cache(csv_path, variant=''):
+    directory = cache_dir(csv_path, variant)
+    if not os.path.isdir(directory):
+        return
+    for file_name in os.listdir(directory):
+        os.remove(os.path.join(directory, file_name))
+
+# Function to append a block of bar columns to the cache, the cache stays invalid until seal_bar_cache
+def append_bar_cache(csv_path, bars, variant=''):
+    directory = cache_dir(csv_path, variant)
+    os.makedirs(directory, exist_ok=True)
+
+    # Invalidate first so a crash half way through never leaves a cache that looks fresh
+    meta_path = os.path.join(directory, CACHE_META)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    for col, values in bars.items():
+        values = np.ascontiguousarray(values)
+        if values.dtype == object:
+            values = values.astype(str)
+        col_path = os.path.join(directory, f'{col}.npy')
+
+        if not os.path.exists(col_path):
+            with open(col_path, 'wb') as f:
+                f.write(npy_header(values.dtype, len(values)))
+                f.write(values.tobytes())
+            continue
+
+        # Append the new values and rewrite the header with the new length
+        with open(col_path, 'r+b') as f:
+            f.seek(0, os.SEEK_END)
+            length = (f.tell() - NPY_HEADER_SIZE) // values.dtype.itemsize
+            f.write(values.tobytes())
+            f.seek(0)
+            f.write(npy_header(values.dtype, length + len(values)))
+
+# Function to mark the cache as matching the current CSV file
+def seal_bar_cache(csv_path, columns, variant='', **extra):
+    directory = cache_dir(csv_path, variant)
+    meta = dict(source_key(csv_path), columns=list(columns), **extra)
+    tmp_path = os.path.join(directory, CACHE_META + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(directory, CACHE_META))
+
+# Function to write a full cache for a CSV file
+def write_bar_cache(csv_path, bars, variant='', **extra):
+    reset_bar_cache(csv_path, variant)
+    append_bar_cache(csv_path, bars, variant)
+    seal_bar_cache(csv_path, bars.keys(), variant, **extra)
+
+# Function to read the meta of the cache of a CSV file, returns None when it is missing or stale
+def read_cache_meta(csv_path, variant=''):
+    meta_path = os.path.join(cache_dir(csv_path, variant), CACHE_META)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    key = source_key(csv_path)
+    if meta.get('size') != key['size'] or meta.get('mtime_ns') != key['mtime_ns']:
+        return None
+    return meta
+
+# Function to check that the cache of a CSV file matches it, without loading any column
+def bar_cache_is_fresh(csv_path, variant=''):
+    return read_cache_meta(csv_path, variant) is not None
+
+# Function to read the cache of a CSV file, returns None when it is missing or stale
+def read_bar_cache(csv_path, usecols=None, mmap_mode=None, variant=''):
+    meta = read_cache_meta(csv_path, variant)
+    if meta is None:
+        return None
+
+    columns = [col for col in meta['columns'] if usecols is None or col in usecols]
+    return {col: np.load(os.path.join(cache_dir(csv_path, variant), f'{col}.npy'), mmap_mode=mmap_mode) for col in columns}
+
+# Function to load bars, preferring the binary cache and rebuilding it from the CSV when it is stale
+def load_bars(csv_path, usecols=None, mmap_mode=None):
+    bars = read_bar_cache(csv_path, usecols, mmap_mode)
+    if bars is not None:
+        return bars
+
+    bars = read_csv_bars(csv_path)
+    try:
+        write_bar_cache(csv_path, bars)
+    except OSError as e:
+        print(f"Could not write the bar cache for '{csv_path}': {e}")
+
+    if usecols is not None:
+        bars = {col: values for col, values in bars.items() if col in usecols}
+    return bars
+
+# Function to get the fixed-point scale of a symbol's prices, JPY pairs are quoted with 3 decimals instead of 5
+def price_scale(symbol):
+    return JPY_PRICE_SCALE if 'JPY' in symbol.upper() else PRICE_SCALE
+
+# Function to get the symbol of a bar file, e.g. 'EURUSD' for 'DATA/EURUSD_C.csv'
+def symbol_of(csv_path):
+    return os.path.basename(csv_path).split('_')[0].split('.')[0]
+
+# Function to get timestamps as int64 minutes since 1970, from datetime64 or compact int minutes
+def to_minutes(dates):
+    dates = np.asarray(dates)
+    if dates.dtype.kind == 'M':
+        return dates.astype('datetime64[m]').astype(np.int64)
+    return dates.astype(np.int64)
+
+# Function to check whether prices are in the compact int form of to_compact
+def is_compact(prices):
+    return np.asarray(prices).dtype.kind in 'iu'
+
+# Function to convert bars to the compact form: int32 minutes, int32 prices scaled by scale, float32 volume
+def to_compact(bars, scale):
+    compact = {}
+    for col, values in bars.items():
+        values = np.asarray(values)
+        if col == 'Date':
+            compact[col] = to_minutes(values).astype(COMPACT_DTYPES['Date'])
+        elif col in PRICE_COLUMNS:
+            compact[col] = np.rint(values * scale).astype(COMPACT_DTYPES['Price'])
+        elif col in COMPACT_DTYPES:
+            compact[col] = values.astype(COMPACT_DTYPES[col])
+        else:
+            compact[col] = values
+    return compact
+
+# Function to convert compact bars back to float64 prices and datetime64 dates
+def from_compact(compact, scale):
+    bars = {}
+    for col, values in compact.items():
+        values = np.asarray(values)
+        if col == 'Date':
+            bars[col] = values.astype(np.int64).astype('datetime64[m]')
+        elif col in PRICE_COLUMNS:
+            bars[col] = values / scale
+        elif col in BAR_DTYPES:
+            bars[col] = values.astype(BAR_DTYPES[col])
+        else:
+            bars[col] = values
+    return bars
+
+# Function to load compact bars and their price scale, with their own binary cache next to the normal one
+def load_compact_bars(csv_path, usecols=None, mmap_mode=None):
+    scale = price_scale(symbol_of(csv_path))
+    compact = read_bar_cache(csv_path, usecols, mmap_mode, COMPACT_VARIANT)
+    if compact is not None:
+        return compact, scale
+
+    compact = to_compact(load_bars(csv_path), scale)
+    try:
+        write_bar_cache(csv_path, compact, COMPACT_VARIANT, scale=scale)
+    except OSError as e:
+        print(f"Could not write the compact bar cache for '{csv_path}': {e}")
+
+    if usecols is not None:
+        compact = {col: values for col, values in compact.items() if col in usecols}
+    return compact, scale
+
+# Function to load bars as a DataFrame, a drop-in for pd.read_csv(file_path, parse_dates=['Date'])
+def load_frame(csv_path, usecols=None, index_col=None):
+    columns = None
+    if usecols is not None:
+        columns = list(usecols) + ([index_col] if index_col is not None and index_col not in usecols else [])
+    return bars_to_frame(load_bars(csv_path, columns), usecols, index_col)
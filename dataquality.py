@@ -0,0 +1,154 @@
+import os
+import json
+import numpy as np
+from dataloader import cache_dir, write_bar_cache, read_bar_cache
+
+# Flags set per bar, combined as bits in a uint8
+DUPLICATE = 1  # Same timestamp as the bar before it
+UNSORTED = 2  # Earlier timestamp than the bar before it
+BAD_OHLC = 4  # High below Low, or Open/Close outside the High-Low range
+SPIKE = 8  # Jump that is reversed on the next bar
+GAP = 16  # Missing bars before this one that are not a weekend close
+MISSING_VALUE = 32  # NaN or inf in one of the prices
+WICK = 64  # Wick far outside the normal range, reported but kept since the close path is fine
+REPAIRABLE = DUPLICATE | UNSORTED | BAD_OHLC | SPIKE | MISSING_VALUE  # Everything repair_bars can fix
+
+FLAG_NAMES = {
+    DUPLICATE: 'duplicate',
+    UNSORTED: 'unsorted',
+    BAD_OHLC: 'bad_ohlc',
+    SPIKE: 'spike',
+    GAP: 'gap',
+    MISSING_VALUE: 'missing_value',
+    WICK: 'wick',
+}
+
+BAR_MINUTES = 5  # Timeframe of the cleaned files
+SPIKE_SIGMAS = 12  # Size of a spike in robust standard deviations of the bar returns
+PRICE_TICK = 0.0001  # Smallest price step of the cleaned files (written with 4 decimals), the least a bar can move
+LARGEST_GAPS = 10  # Number of largest gaps listed in the report
+
+# The gap map and flags are a cache variant of their own, so rebuilding the bar cache keeps them,
+# and like any cache they are stale once the CSV changes
+QUALITY_VARIANT = 'quality'
+QUALITY_REPORT = 'quality.json'
+
+# Function to flag every bar and count the missing bars before it, all in one vectorized pass
+def check_bars(bars, bar_minutes=BAR_MINUTES):
+    minutes = np.asarray(bars['Date']).astype('datetime64[m]').astype(np.int64)
+    opens = np.asarray(bars['Open'], dtype=np.float64)
+    highs = np.asarray(bars['High'], dtype=np.float64)
+    lows = np.asarray(bars['Low'], dtype=np.float64)
+    closes = np.asarray(bars['Close'], dtype=np.float64)
+    flags = np.zeros(len(minutes), dtype=np.uint8)
+    if len(minutes) == 0:
+        return flags, np.zeros(0, dtype=np.int32)
+
+    # Timestamps
+    step = np.diff(minutes)
+    flags[1:][step == 0] |= DUPLICATE
+    flags[1:][step < 0] |= UNSORTED
+
+    # Prices
+    finite = np.isfinite(opens) & np.isfinite(highs) & np.isfinite(lows) & np.isfinite(closes)
+    flags[~finite] |= MISSING_VALUE
+    with np.errstate(invalid='ignore'):
+        bad = (highs < lows) | (opens > highs) | (opens < lows) | (closes > highs) | (closes < lows)
+    flags[bad & finite] |= BAD_OHLC
+
+    # Spikes, measured against a robust estimate of the normal bar-to-bar move
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.diff(np.log(closes))
+        wick_up = np.log(highs / np.maximum(opens, closes))
+        wick_down = np.log(np.minimum(opens, closes) / lows)
+    valid = np.isfinite(returns)
+    if valid.any():
+        median = np.median(returns[valid])
+        sigma = 1.4826 * np.median(np.abs(returns[valid] - median))
+
+        # On quiet data most closes do not move at all and the median deviation is 0,
+        # then the spread of the bars that did move is used, and never less than one tick
+        tick = np.log1p(PRICE_TICK / np.nanmedian(closes))
+        moved = returns[valid][returns[valid] != 0]
+        if sigma < tick and len(moved) > 1:
+            sigma = np.std(moved)
+        limit = SPIKE_SIGMAS * max(sigma, tick)
+        with np.errstate(invalid='ignore'):
+            jump = np.abs(returns) > limit
+            # A jump followed by a jump back the other way
+            reversal = jump[:-1] & jump[1:] & (np.sign(returns[:-1]) != np.sign(returns[1:]))
+            flags[1:-1][reversal] |= SPIKE
+            flags[(wick_up > limit) | (wick_down > limit)] |= WICK
+
+    # Missing bars before each bar, weekend closes are counted but not flagged
+    gaps = np.zeros(len(minutes), dtype=np.int32)
+    gaps[1:] = np.clip(step // bar_minutes - 1, 0, None)
+    days = minutes // 1440
+    saturdays = (days[1:] - 2) // 7 - (days[:-1] - 2) // 7  # 1970-01-01 was a Thursday, day 2 a Saturday
+    flags[1:][(gaps[1:] > 0) & (saturdays == 0)] |= GAP
+
+    return flags, gaps
+
+# Function to summarise the flags and gaps into a small report
+def build_report(bars, flags, gaps):
+    dates = np.asarray(bars['Date']).astype('datetime64[m]')
+    report = {
+        'rows': int(len(flags)),
+        'first_date': str(dates[0]) if len(dates) else None,
+        'last_date': str(dates[-1]) if len(dates) else None,
+        'counts': {name: int(np.count_nonzero(flags & flag)) for flag, name in FLAG_NAMES.items()},
+        'missing_bars': int(gaps[(flags & GAP) != 0].sum()),
+    }
+
+    # Largest gaps that are not weekend closes
+    gap_rows = np.flatnonzero(flags & GAP)
+    largest = gap_rows[np.argsort(gaps[gap_rows])[::-1][:LARGEST_GAPS]]
+    report['largest_gaps'] = [{'before': str(dates[i]), 'missing_bars': int(gaps[i])} for i in largest]
+    return report
+
+# Function to fix what can be fixed: sort, drop duplicates (last one wins), bars with missing values and spikes,
+# and widen High/Low so they contain Open and Close. Bars with only a long wick are kept
+def repair_bars(bars, flags, drop_spikes=True):
+    minutes = np.asarray(bars['Date']).astype('datetime64[m]')
+
+    # Stable sort keeps the later of two equal timestamps last
+    order = np.argsort(minutes, kind='stable')
+    keep = np.ones(len(order), dtype=bool)
+    keep[:-1] = minutes[order][1:] != minutes[order][:-1]
+
+    drop = MISSING_VALUE | (SPIKE if drop_spikes else 0)
+    keep &= (flags[order] & drop) == 0
+    rows = order[keep]
+
+    repaired = {col: np.asarray(values)[rows] for col, values in bars.items()}
+    prices = np.stack([repaired['Open'], repaired['High'], repaired['Low'], repaired['Close']])
+    repaired['High'] = prices.max(axis=0)
+    repaired['Low'] = prices.min(axis=0)
+    return repaired
+
+# Function to save the report, the gap map and the flags of a CSV file in its quality cache
+def write_quality(csv_path, report, gaps, flags):
+    write_bar_cache(csv_path, {'Gaps': gaps, 'Flags': flags}, QUALITY_VARIANT)
+    with open(os.path.join(cache_dir(csv_path, QUALITY_VARIANT), QUALITY_REPORT), 'w') as f:
+        json.dump(report, f, indent=2)
+
+# Function to load the gap map written by write_quality, memory-mapped, None when it is missing or stale.
+# Without weekends only the missing bars flagged GAP are counted
+def load_gap_map(csv_path, weekends=True):
+    quality = read_bar_cache(csv_path, mmap_mode='r', variant=QUALITY_VARIANT)
+    if quality is None:
+        return None
+    if weekends:
+        return quality['Gaps']
+    return np.where(quality['Flags'] & GAP, quality['Gaps'], 0)
+
+# Function to turn the gap map into running totals, computed once so any window can be checked in O(1)
+def gap_totals(gaps):
+    return np.concatenate(([0], np.cumsum(gaps, dtype=np.int64)))
+
+# Function to check that windows of bars [start, stop) have no missing bars inside them (weekends included if the gap map has them)
+def window_is_complete(totals, start, stop):
+    # Gaps before the first bar of the window do not count
+    start = np.asarray(start)
+    stop = np.asarray(stop)
+    return totals[stop] - totals[np.minimum(start + 1, stop)] == 0
@@ -0,0 +1,156 @@
+import os
+import json
+import numpy as np
+from dataloader import npy_header, NPY_HEADER_SIZE
+
+# Files of a frame dataset directory: every frame one after the other in a single .npy file,
+# and the label and timestamp of every frame in arrays of the same length
+FRAMES_FILE = 'frames.npy'
+LABELS_FILE = 'labels.npy'
+TIMESTAMPS_FILE = 'timestamps.npy'
+SHARDS_FILE = 'shards.npy'  # Shard and position of every frame in a merged index
+POSITIONS_FILE = 'positions.npy'
+DATASET_META = 'meta.json'
+
+# Labels are stored as int8 codes, END_OF_DATA marks bars without enough future bars to label them
+LABEL_CODES = {
+    'DOWN': -1,
+    'NEUTRAL': 0,
+    'UP': 1,
+    'END_OF_DATA': -128,
+}
+
+# Function to get the int8 code of a price direction, e.g. 1 for 'UP'
+def label_code(direction):
+    if direction not in LABEL_CODES:
+        raise ValueError(f"Unknown label '{direction}', use one of {list(LABEL_CODES)}")
+    return LABEL_CODES[direction]
+
+class FrameWriter:
+    # Writes frames straight into a preallocated memory-mapped uint8 file instead of one PNG per frame,
+    # the file grows when more frames come than expected and is cut to the frames written on close
+    def __init__(self, path, capacity, height, width, channels=3):
+        self.path = path
+        self.frame_shape = (height, width, channels)
+        self.count = 0
+        os.makedirs(path, exist_ok=True)
+
+        # Invalidate first so a crash half way through never leaves a dataset that looks complete
+        meta_path = os.path.join(path, DATASET_META)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+
+        self.frames_path = os.path.join(path, FRAMES_FILE)
+        with open(self.frames_path, 'wb') as f:
+            f.write(npy_header(np.uint8, 0, self.frame_shape))
+        self.frames = None
+        self.labels = np.zeros(0, dtype=np.int8)
+        self.timestamps = np.zeros(0, dtype='datetime64[m]')
+        self._resize(max(capacity, 1))
+
+    def _resize(self, capacity):
+        # The file is extended without writing it, so the unused part takes no disk space
+        if self.frames is not None:
+            self.frames.flush()
+            del self.frames
+        with open(self.frames_path, 'r+b') as f:
+            f.truncate(NPY_HEADER_SIZE + capacity * int(np.prod(self.frame_shape)))
+        self.frames = np.memmap(self.frames_path, dtype=np.uint8, mode='r+', offset=NPY_HEADER_SIZE, shape=(capacity,) + self.frame_shape)
+        self.labels = np.resize(self.labels, capacity)
+        self.timestamps = np.resize(self.timestamps, capacity)
+
+    def write_batch(self, frames, labels, timestamps):
+        # Add (N, height, width, channels) frames with their labels (names or codes) and timestamps
+        frames = np.asarray(frames, dtype=np.uint8)
+        stop = self.count + len(frames)
+        if stop > len(self.frames):
+            self._resize(max(stop, 2 * len(self.frames)))
+        self.frames[self.count:stop] = frames
+        self.labels[self.count:stop] = [label_code(label) if isinstance(label, str) else label for label in labels]
+        self.timestamps[self.count:stop] = np.asarray(timestamps, dtype='datetime64[m]')
+        self.count = stop
+
+    def write(self, pixels, label, timestamp):
+        self.write_batch(np.asarray(pixels)[None], [label], [timestamp])
+
+    def close(self):
+        # Cut the file to the frames written, then save the index and mark the dataset complete
+        self.frames.flush()
+        del self.frames
+        self.frames = None
+        with open(self.frames_path, 'r+b') as f:
+            f.write(npy_header(np.uint8, self.count, self.frame_shape))
+            f.truncate(NPY_HEADER_SIZE + self.count * int(np.prod(self.frame_shape)))
+        np.save(os.path.join(self.path, LABELS_FILE), self.labels[:self.count])
+        np.save(os.path.join(self.path, TIMESTAMPS_FILE), self.timestamps[:self.count])
+
+        meta = {'count': self.count, 'frame_shape': list(self.frame_shape), 'label_codes': LABEL_CODES}
+        tmp_path = os.path.join(self.path, DATASET_META + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(self.path, DATASET_META))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Function to open a frame dataset, frame k is frames[k] read straight from the memory-mapped file with no decoding,
+# raises ValueError when the dataset was never closed
+def load_dataset(path, mmap_mode='r'):
+    meta_path = os.path.join(path, DATASET_META)
+    if not os.path.exists(meta_path):
+        raise ValueError(f"'{path}' is not a complete frame dataset, it has no {DATASET_META}")
+    frames = np.load(os.path.join(path, FRAMES_FILE), mmap_mode=mmap_mode)
+    labels = np.load(os.path.join(path, LABELS_FILE))
+    timestamps = np.load(os.path.join(path, TIMESTAMPS_FILE))
+    return frames, labels, timestamps
+
+# Function to merge the indexes of dataset shards written in parallel into one index in path, the frames stay in their shards,
+# frame k of the merged dataset is frame positions[k] of shard shards[k]
+def merge_shards(path, shard_dirs):
+    labels, timestamps, shards, positions = [], [], [], []
+    frame_shape = None
+    for shard, shard_dir in enumerate(shard_dirs):
+        with open(os.path.join(shard_dir, DATASET_META)) as f:
+            meta = json.load(f)
+        frame_shape = frame_shape or meta['frame_shape']
+        if meta['frame_shape'] != frame_shape:
+            raise ValueError(f"Shard '{shard_dir}' has frames of shape {meta['frame_shape']}, the others {frame_shape}")
+        labels.append(np.load(os.path.join(shard_dir, LABELS_FILE)))
+        timestamps.append(np.load(os.path.join(shard_dir, TIMESTAMPS_FILE)))
+        shards.append(np.full(meta['count'], shard, dtype=np.int32))
+        positions.append(np.arange(meta['count'], dtype=np.int64))
+
+    os.makedirs(path, exist_ok=True)
+    meta_path = os.path.join(path, DATASET_META)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    timestamps = np.concatenate(timestamps) if timestamps else np.zeros(0, dtype='datetime64[m]')
+    order = np.argsort(timestamps, kind='stable')
+    np.save(os.path.join(path, LABELS_FILE), np.concatenate(labels)[order] if labels else np.zeros(0, dtype=np.int8))
+    np.save(os.path.join(path, TIMESTAMPS_FILE), timestamps[order])
+    np.save(os.path.join(path, SHARDS_FILE), np.concatenate(shards)[order] if shards else np.zeros(0, dtype=np.int32))
+    np.save(os.path.join(path, POSITIONS_FILE), np.concatenate(positions)[order] if positions else np.zeros(0, dtype=np.int64))
+
+    meta = {'count': len(timestamps), 'frame_shape': frame_shape, 'label_codes': LABEL_CODES,
+            'shards': [os.path.relpath(os.path.abspath(shard_dir), os.path.abspath(path)) for shard_dir in shard_dirs]}
+    tmp_path = os.path.join(path, DATASET_META + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+# Function to open a dataset merged from shards, returns the memory-mapped frames of every shard and the merged index
+def load_sharded_dataset(path, mmap_mode='r'):
+    meta_path = os.path.join(path, DATASET_META)
+    if not os.path.exists(meta_path):
+        raise ValueError(f"'{path}' is not a complete frame dataset, it has no {DATASET_META}")
+    with open(meta_path) as f:
+        meta = json.load(f)
+    frames = [np.load(os.path.join(path, shard_dir, FRAMES_FILE), mmap_mode=mmap_mode) for shard_dir in meta['shards']]
+    labels = np.load(os.path.join(path, LABELS_FILE))
+    timestamps = np.load(os.path.join(path, TIMESTAMPS_FILE))
+    shards = np.load(os.path.join(path, SHARDS_FILE))
+    positions = np.load(os.path.join(path, POSITIONS_FILE))
+    return frames, labels, timestamps, shards, positions
@@ -1,5 +1,6 @@
 import pandas as pd
 import os
+from dataloader import parse_dates
 
 # Define the input directory and output directory
 input_dir = 'E:/Projects/JMAI/DATA - Copy'
@@ -16,7 +17,7 @@ for file in csv_files:
     df = pd.read_csv(os.path.join(input_dir, file))
     
     # Convert the 'Date' column to datetime
-    df['Date'] = pd.to_datetime(df['Date'])
+    df['Date'] = parse_dates(df['Date'].to_numpy()).astype('datetime64[ns]')
     
     # Filter the data for the year 2000
     df_2000 = df[df['Date'].dt.year == 2000]
@@ -0,0 +1,98 @@
+import numpy as np
+from dataloader import to_minutes
+from windowindex import window_bounds
+from dataset import LABEL_CODES
+from dataquality import gap_totals, window_is_complete
+
+# Sessions by hour of the bar time, [start hour, end hour)
+SESSIONS = {
+    'ASIA': (0, 7),
+    'LONDON': (7, 12),
+    'OVERLAP': (12, 16),  # London and New York
+    'NEWYORK': (16, 21),
+    'LATE': (21, 24),
+}
+VOLATILITY_BARS = 24  # Bars the rolling volatility is measured over
+PLAN_SEED = 0  # Seed of the random pick, so a plan can be rendered again
+
+# Function to find the bars smallchartV3 renders a frame for (datetime64 or compact int minute dates), before the horizon cut at the end:
+# from start_date on, a full window of num_bars bars and at least num_bars M5 bars in the 5 * num_bars minutes up to the bar.
+# With the M5 gap map of dataquality.load_gap_map, bars whose chart has missing M5 bars anywhere in it are left out too
+def chart_frames(dates, m5_dates, start_date, num_bars, m5_gaps=None):
+    minutes = to_minutes(dates)
+    positions = np.arange(len(minutes))
+    m5_starts, m5_stops = window_bounds(m5_dates, minutes, 5 * num_bars, include_start=True)
+    first = int(np.searchsorted(minutes, to_minutes(np.datetime64(start_date, 'm'))))
+    frames = (positions >= max(first, num_bars)) & (m5_stops - m5_starts >= num_bars)
+
+    if m5_gaps is not None:
+        if len(m5_gaps) != len(m5_dates):
+            raise ValueError(f"The gap map has {len(m5_gaps)} bars, the M5 bars {len(m5_dates)}")
+        # The chart reaches back to the first M5 bar of its first H1 bar, or of its M5 window if that starts earlier
+        firsts = np.searchsorted(to_minutes(m5_dates), minutes[np.maximum(positions - num_bars + 1, 0)])
+        frames &= window_is_complete(gap_totals(m5_gaps), np.minimum(firsts, m5_starts), m5_stops)
+    return frames
+
+# Function to get the rolling standard deviation of the close-to-close log returns of the bars up to every bar, NaN until there are enough
+def rolling_volatility(closes, bars=VOLATILITY_BARS):
+    closes = np.asarray(closes, dtype=np.float64)
+    volatility = np.full(len(closes), np.nan)
+    if len(closes) <= bars:
+        return volatility
+    returns = np.diff(np.log(closes))
+    returns -= np.nanmean(returns)  # Centred so the running sums do not lose the small differences
+
+    # Running sums of the returns and their squares, every window is the difference of two of them
+    sums = np.r_[0, np.cumsum(returns)]
+    squares = np.r_[0, np.cumsum(returns ** 2)]
+    window_sum = sums[bars:] - sums[:-bars]
+    window_squares = squares[bars:] - squares[:-bars]
+    variance = (window_squares - window_sum ** 2 / bars) / (bars - 1)
+    volatility[bars:] = np.sqrt(np.maximum(variance, 0))
+    return volatility
+
+# Function to get the features frames can be chosen by for every bar: Weekday (Monday=1 like 1DataClean), Hour, Session and Volatility
+def bar_features(dates, closes, volatility_bars=VOLATILITY_BARS):
+    minutes = to_minutes(dates)
+    hours = minutes // 60 % 24
+    sessions = np.empty(len(minutes), dtype=object)
+    for session, (start, end) in SESSIONS.items():
+        sessions[(hours >= start) & (hours < end)] = session
+    return {
+        'Weekday': ((minutes // 1440 + 3) % 7 + 1).astype(np.int8),  # 1970-01-01 was a Thursday
+        'Hour': hours.astype(np.int8),
+        'Session': sessions,
+        'Volatility': rolling_volatility(closes, volatility_bars),
+    }
+
+# Function to pick frames per class so the classes come out in the target ratios, e.g. {'UP': 1, 'DOWN': 1, 'NEUTRAL': 1},
+# as many frames as the scarcest class allows or count frames in total
+def balance_frames(positions, labels, ratios, count=None, rng=None):
+    rng = rng or np.random.default_rng(PLAN_SEED)
+    ratios = {label: ratio for label, ratio in ratios.items() if ratio > 0}
+    total = sum(ratios.values())
+    available = {label: np.flatnonzero(labels[positions] == LABEL_CODES[label]) for label in ratios}
+
+    most = min(len(available[label]) * total / ratio for label, ratio in ratios.items()) if ratios else 0
+    count = int(most) if count is None else min(count, int(most))
+    picked = [positions[rng.choice(available[label], int(count * ratio / total), replace=False)] for label, ratio in ratios.items()]
+    return np.sort(np.concatenate(picked)) if picked else positions[:0]
+
+# Function to plan which frames to render: frames among candidates that have a label, pass predicate(features)
+# and, with ratios, are picked to hit the class ratios. Returns the sorted bar positions
+def plan_frames(labels, candidates, features=None, ratios=None, count=None, predicate=None, seed=PLAN_SEED):
+    keep = np.asarray(candidates, dtype=bool) & (labels != LABEL_CODES['END_OF_DATA'])
+    if predicate is not None:
+        keep &= np.asarray(predicate(features), dtype=bool)
+    positions = np.flatnonzero(keep)
+
+    rng = np.random.default_rng(seed)
+    if ratios:
+        return balance_frames(positions, labels, ratios, count, rng)
+    if count is not None and count < len(positions):
+        return np.sort(rng.choice(positions, count, replace=False))
+    return positions
+
+# Function to count the frames of every class in a plan
+def plan_counts(labels, positions):
+    return {label: int((labels[positions] == code).sum()) for label, code in LABEL_CODES.items() if label != 'END_OF_DATA'}
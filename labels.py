@@ -0,0 +1,181 @@
+import numpy as np
+from fractions import Fraction
+from dataset import LABEL_CODES
+from windowindex import SparseTable
+from dataloader import is_compact
+
+# Label rules used by the chart scripts:
+# 'max_change_first' = UP when the highest close of the next bars rose more than the threshold, else DOWN when the lowest fell more (smallchartV3),
+# 'close_at_horizon' = the close horizon bars ahead against the threshold (AniCharts),
+# 'first_crossing' = the first of the next bars whose close moved more than the threshold decides (smallchartV3-UPDOWN)
+RULES = ('max_change_first', 'close_at_horizon', 'first_crossing')
+RULE = 'max_change_first'
+
+# Names of the int8 label codes, e.g. 'UP' for 1
+LABEL_NAMES = {code: name for name, code in LABEL_CODES.items()}
+
+# Function to get the highest and lowest close of the horizon bars after every bar, NaN where there are none,
+# from one sparse table so any horizon costs the same
+def forward_extremes(closes, horizon, table_max=None, table_min=None):
+    closes = np.asarray(closes, dtype=np.float64)
+    if table_max is None:
+        table_max = SparseTable(closes, np.fmax, horizon)
+    if table_min is None:
+        table_min = SparseTable(closes, np.fmin, horizon)
+    starts = np.minimum(np.arange(1, len(closes) + 1), len(closes))
+    stops = np.minimum(starts + horizon, len(closes))
+    return table_max.query(starts, stops), table_min.query(starts, stops)
+
+# Function to compare compact int prices with a threshold exactly: where future > current * (1 + upper) and where future < current * (1 - lower),
+# or >= and <= when inclusive. The thresholds are taken as the decimal fractions they are written as, e.g. 0.005 as 1/200,
+# so both sides are whole numbers far below 2**53 and no rounding is involved
+def integer_moves(future, current, upper, lower=None, inclusive=False):
+    upper = Fraction(repr(upper))
+    lower = upper if lower is None else Fraction(repr(lower))
+    future = np.asarray(future, dtype=np.float64)
+    current = np.asarray(current, dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        up_future = future * upper.denominator
+        up_level = current * (upper.denominator + upper.numerator)
+        down_future = future * lower.denominator
+        down_level = current * (lower.denominator - lower.numerator)
+        if inclusive:
+            return up_future >= up_level, down_future <= down_level
+        return up_future > up_level, down_future < down_level
+
+# Function to label bars by the 'max_change_first' rule from their forward extremes, so one forward_extremes serves every threshold,
+# compact int closes are compared exactly
+def max_change_labels(closes, future_max, future_min, horizon, threshold, compact=False):
+    labels = np.full(len(closes), LABEL_CODES['NEUTRAL'], dtype=np.int8)
+    if compact:
+        up, _ = integer_moves(future_max, closes, threshold)
+        _, down = integer_moves(future_min, closes, threshold)
+        labels[down] = LABEL_CODES['DOWN']
+        labels[up] = LABEL_CODES['UP']
+    else:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            labels[future_min / closes - 1 < -threshold] = LABEL_CODES['DOWN']
+            labels[future_max / closes - 1 > threshold] = LABEL_CODES['UP']
+    labels[max(len(closes) - horizon, 0):] = LABEL_CODES['END_OF_DATA']
+    return labels
+
+# Function to label every bar at once as int8 UP/DOWN/NEUTRAL codes, like the per-bar rules of the scripts,
+# bars without horizon bars after them are END_OF_DATA for 'max_change_first', NEUTRAL for 'close_at_horizon'
+# and decided by the bars there are for 'first_crossing'. Compact int closes are compared with the threshold exactly
+def future_labels(closes, horizon, threshold, rule=RULE):
+    if rule not in RULES:
+        raise ValueError(f"Unknown label rule '{rule}', use one of {RULES}")
+    compact = is_compact(closes)
+    closes = np.asarray(closes, dtype=np.float64)
+    labels = np.full(len(closes), LABEL_CODES['NEUTRAL'], dtype=np.int8)
+
+    if rule == 'max_change_first':
+        return max_change_labels(closes, *forward_extremes(closes, horizon), horizon, threshold, compact)
+
+    if rule == 'close_at_horizon':
+        ahead = max(len(closes) - horizon, 0)
+        if compact:
+            up, down = integer_moves(closes[horizon:], closes[:ahead], threshold)
+            labels[:ahead][up] = LABEL_CODES['UP']
+            labels[:ahead][down] = LABEL_CODES['DOWN']
+            return labels
+        change = np.zeros(len(closes))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            change[:ahead] = closes[horizon:] / closes[:ahead] - 1
+        labels[change > threshold] = LABEL_CODES['UP']
+        labels[change < -threshold] = LABEL_CODES['DOWN']
+        return labels
+
+    # One vectorized pass per bar ahead, bars that crossed stay decided
+    undecided = np.ones(len(closes), dtype=bool)
+    for ahead in range(1, min(horizon, len(closes) - 1) + 1):
+        if compact:
+            up, down = integer_moves(closes[ahead:], closes[:len(closes) - ahead], threshold)
+        else:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                change = (closes[ahead:] - closes[:len(closes) - ahead]) / closes[:len(closes) - ahead]
+            up, down = change > threshold, change < -threshold
+        open_ = undecided[:len(up)]
+        up = open_ & up
+        down = open_ & down
+        labels[:len(up)][up] = LABEL_CODES['UP']
+        labels[:len(up)][down] = LABEL_CODES['DOWN']
+        undecided[:len(up)] &= ~(up | down)
+    return labels
+
+# Function to label every bar with the triple barrier method on the High/Low path: UP when a High reaches close * (1 + upper) first,
+# DOWN when a Low reaches close * (1 - lower) first, NEUTRAL when neither happens within horizon bars (the time barrier).
+# The path inside a bar is unknown, so a bar that reaches both barriers counts as tie. Returns the int8 labels, the offset
+# of the bar that decided it (horizon for the time barrier, -1 for END_OF_DATA) and the realized return at that barrier.
+# Compact int prices are compared with the barriers exactly
+def triple_barrier_labels(closes, highs, lows, horizon, upper, lower=None, tie='DOWN'):
+    if tie not in ('UP', 'DOWN'):
+        raise ValueError(f"Unknown tie label '{tie}', use 'UP' or 'DOWN'")
+    lower = upper if lower is None else lower
+    compact = is_compact(closes)
+    closes, highs, lows = (np.asarray(values, dtype=np.float64) for values in (closes, highs, lows))
+    labels = np.full(len(closes), LABEL_CODES['NEUTRAL'], dtype=np.int8)
+    offsets = np.full(len(closes), -1, dtype=np.int32)
+    returns = np.full(len(closes), np.nan)
+    upper_prices = closes * (1 + upper)
+    lower_prices = closes * (1 - lower)
+
+    # One vectorized pass per bar ahead over the bars no barrier has decided yet, so most passes only touch a few of them
+    touched = np.zeros(len(closes), dtype=bool)
+    active = np.flatnonzero(np.isfinite(closes))
+    for ahead in range(1, horizon + 1):
+        active = active[active + ahead < len(closes)]
+        if len(active) == 0:
+            break
+        if compact:
+            up, _ = integer_moves(highs[active + ahead], closes[active], upper, lower, inclusive=True)
+            _, down = integer_moves(lows[active + ahead], closes[active], upper, lower, inclusive=True)
+        else:
+            up = highs[active + ahead] >= upper_prices[active]
+            down = lows[active + ahead] <= lower_prices[active]
+        if tie == 'DOWN':
+            up &= ~down
+        else:
+            down &= ~up
+        labels[active[up]] = LABEL_CODES['UP']
+        returns[active[up]] = upper
+        labels[active[down]] = LABEL_CODES['DOWN']
+        returns[active[down]] = -lower
+        hit = active[up | down]
+        offsets[hit] = ahead
+        touched[hit] = True
+        active = active[~(up | down)]
+
+    # Time barrier, the return of the close horizon bars later
+    ends = np.arange(len(closes)) + horizon
+    timed = ~touched & (ends < len(closes))
+    offsets[timed] = horizon
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns[timed] = closes[ends[timed]] / closes[timed] - 1
+    labels[~touched & ~timed] = LABEL_CODES['END_OF_DATA']
+    return labels, offsets, returns
+
+# Function to label a series for every (rule, horizon, threshold), returns {(rule, horizon, threshold): int8 labels}.
+# The forward extremes of every horizon come from one pair of sparse tables and serve all thresholds
+def label_grid(closes, horizons, thresholds, rules=(RULE,)):
+    compact = is_compact(closes)
+    prices = np.asarray(closes)
+    closes = prices.astype(np.float64)
+    grid = {}
+    tables = None
+    for rule in rules:
+        for horizon in horizons:
+            if rule == 'max_change_first':
+                if tables is None:
+                    tables = (SparseTable(closes, np.fmax, max(horizons)), SparseTable(closes, np.fmin, max(horizons)))
+                extremes = forward_extremes(closes, horizon, *tables)
+            for threshold in thresholds:
+                if rule == 'max_change_first':
+                    grid[rule, horizon, threshold] = max_change_labels(closes, *extremes, horizon, threshold, compact)
+                else:
+                    grid[rule, horizon, threshold] = future_labels(prices, horizon, threshold, rule)
+    return grid
+
+# Function to get the name of every label code, e.g. for file names
+def label_names(labels):
+    return [LABEL_NAMES[code] for code in np.asarray(labels).tolist()]
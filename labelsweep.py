@@ -0,0 +1,60 @@
+import os
+import glob
+import time
+import numpy as np
+import pandas as pd
+from dataloader import load_compact_bars, symbol_of, to_minutes
+from resampler import load_compact_timeframe
+from frameplanner import chart_frames
+from labels import label_grid, triple_barrier_labels, LABEL_CODES
+
+# Grid to sweep, every combination is labelled without rendering anything
+SYMBOL_FILES = sorted(glob.glob('DATA/*_C.csv'))
+THRESHOLDS = [0.001, 0.002, 0.003, 0.005, 0.0075, 0.01]  # PRICE_CHANGE_THRESHOLD values
+HORIZONS = [1, 2, 4, 8, 12, 24]  # FUTURE_BARS values
+RULES = ['max_change_first']  # Label rules of labels.py, or 'triple_barrier'
+
+# Frames are chosen like smallchartV3 does
+TIMEFRAME = 'H1'
+START_END_DATE = '2000-02-01 00:00:00'
+NUM_BARS = 500
+SWEEP_OUTPUT = 'DATA/REPORTS/label_sweep.csv'  # Outside DATA/ itself, where 1DataClean takes every .csv for a broker export
+
+# Function to get the frames and class balance of every (rule, horizon, threshold) for one symbol, all from one load of its bars.
+# The bars stay in the compact form, the labels compare their int prices with the thresholds exactly
+def sweep_symbol(csv_path, thresholds=THRESHOLDS, horizons=HORIZONS, rules=RULES):
+    bars, _ = load_compact_timeframe(csv_path, TIMEFRAME, ['Date', 'High', 'Low', 'Close'])
+    minutes = to_minutes(bars['Date'])
+    frames = chart_frames(minutes, load_compact_bars(csv_path, ['Date'])[0]['Date'], START_END_DATE, NUM_BARS)
+
+    grid = label_grid(bars['Close'], horizons, thresholds, [rule for rule in rules if rule != 'triple_barrier'])
+    if 'triple_barrier' in rules:
+        for horizon in horizons:
+            for threshold in thresholds:
+                grid['triple_barrier', horizon, threshold] = triple_barrier_labels(bars['Close'], bars['High'], bars['Low'], horizon, threshold)[0]
+
+    rows = []
+    for (rule, horizon, threshold), labels in grid.items():
+        # The last horizon bars and hours have no label, like the loop range and end_date of smallchartV3
+        labelled = (np.arange(len(minutes)) < len(minutes) - horizon) & (minutes <= minutes[-1] - 60 * horizon)
+        kept = labels[frames & labelled]
+        counts = {name: int((kept == code).sum()) for name, code in LABEL_CODES.items() if name != 'END_OF_DATA'}
+        row = {'Symbol': symbol_of(csv_path), 'Rule': rule, 'Horizon': horizon, 'Threshold': threshold, 'Frames': len(kept), **counts}
+        for name in counts:
+            row[f'{name}%'] = 100 * counts[name] / len(kept) if len(kept) else np.nan
+        rows.append(row)
+    return rows
+
+if __name__ == "__main__":
+    started = time.perf_counter()
+    rows = []
+    for csv_path in SYMBOL_FILES:
+        rows += sweep_symbol(csv_path)
+        print(f"Labelled '{csv_path}'")
+    table = pd.DataFrame(rows)
+
+    with pd.option_context('display.max_rows', None, 'display.width', 200, 'display.float_format', '{:.4g}'.format):
+        print(table.to_string(index=False))
+    os.makedirs(os.path.dirname(SWEEP_OUTPUT), exist_ok=True)
+    table.to_csv(SWEEP_OUTPUT, index=False)
+    print(f"{len(table)} settings of {len(SYMBOL_FILES)} symbols in {time.perf_counter() - started:.1f}s, table saved to '{SWEEP_OUTPUT}'")
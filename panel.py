@@ -0,0 +1,65 @@
+import os
+import concurrent.futures
+from functools import reduce
+import numpy as np
+from dataloader import load_bars, symbol_of, to_minutes
+
+# How symbols are lined up on the common time axis:
+# 'intersect' = only the times every symbol has a bar for,
+# 'ffill' = every time any symbol has a bar for, missing bars repeat the last close with zero volume
+ALIGN_POLICIES = ('intersect', 'ffill')
+
+# Function to list the cleaned files of a data directory
+def find_bar_files(data_dir, suffix='_C.csv'):
+    return sorted(os.path.join(data_dir, f) for f in os.listdir(data_dir) if f.endswith(suffix))
+
+# Function to line up one symbol's columns on the common time axis
+def align_bars(bars, axis, fields, policy):
+    minutes = to_minutes(bars['Date'])
+
+    # Position of the bar at (or, for ffill, last bar before) each time of the axis
+    pos = np.searchsorted(minutes, axis, side='right') - 1
+    before_first = pos < 0
+    pos[before_first] = 0
+    exact = ~before_first & (minutes[pos] == axis) if len(minutes) else np.zeros(len(axis), dtype=bool)
+
+    aligned = {}
+    for field in fields:
+        values = np.asarray(bars[field])[pos] if len(minutes) else np.zeros(len(axis))
+        if policy == 'ffill':
+            values = values.astype(np.float64)
+            if field in ('Open', 'High', 'Low') and 'Close' in bars:
+                # A filled bar is flat at the last close
+                values = np.where(exact, values, np.asarray(bars['Close'])[pos])
+            elif field == 'Volume':
+                values = np.where(exact, values, 0)
+            values[before_first] = np.nan
+        aligned[field] = values
+    return aligned
+
+# Function to load many symbols concurrently and align them once onto a common time axis,
+# returns the symbols and a dict with 'Date' plus one (symbols x time) array per field
+def load_panel(csv_paths, fields=('Open', 'High', 'Low', 'Close', 'Volume'), policy='intersect', loader=None, max_workers=None):
+    if policy not in ALIGN_POLICIES:
+        raise ValueError(f"Unknown alignment policy '{policy}', use one of {ALIGN_POLICIES}")
+
+    fields = list(fields)
+    if loader is None:
+        loader = lambda csv_path: load_bars(csv_path, ['Date'] + fields)
+
+    # Loading is mostly file reads and NumPy, which release the GIL, so threads are enough
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        all_bars = list(executor.map(loader, csv_paths))
+    symbols = [symbol_of(csv_path) for csv_path in csv_paths]
+
+    # Common time axis
+    all_minutes = [to_minutes(bars['Date']) for bars in all_bars]
+    combine = np.intersect1d if policy == 'intersect' else np.union1d
+    axis = reduce(combine, all_minutes) if all_minutes else np.zeros(0, dtype=np.int64)
+
+    # One contiguous (symbols x time) array per field
+    panel = {'Date': axis.astype('datetime64[m]')}
+    aligned = [align_bars(bars, axis, fields, policy) for bars in all_bars]
+    for field in fields:
+        panel[field] = np.ascontiguousarray(np.stack([columns[field] for columns in aligned])) if aligned else np.zeros((0, len(axis)))
+    return symbols, panel
@@ -0,0 +1,30 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Most items a threaded stage holds at once, waiting or being worked on, so memory stays flat however far ahead the source is
+QUEUE_SIZE = 32
+
+# Function to run function over items in worker threads, results come out in the order of the items.
+# The source is only read while fewer than queue_size items are in flight, so a slow stage holds back the stages before it
+def threaded_map(function, items, threads, queue_size=QUEUE_SIZE):
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        pending = deque()
+        for item in items:
+            if len(pending) >= queue_size:
+                yield pending.popleft().result()
+            pending.append(pool.submit(function, item))
+        while pending:
+            yield pending.popleft().result()
+
+# Function to chain stages over items, every stage is (function, threads): 0 threads runs the stage in the calling thread,
+# more run it in a pool behind a bounded queue. Every item is pulled through all stages, returns how many came out
+def run_pipeline(items, stages, queue_size=QUEUE_SIZE):
+    for function, threads in stages:
+        if threads:
+            items = threaded_map(function, items, threads, queue_size)
+        else:
+            items = map(function, items)
+    count = 0
+    for _ in items:
+        count += 1
+    return count
@@ -0,0 +1,188 @@
+import numpy as np
+from dataloader import is_compact
+
+# Colours of the chart
+WICK_COLOR = (255, 255, 0)  # Yellow, the High-Low line
+UPPER_WICK_COLOR = (0, 0, 255)  # Blue, the part of the High-Low line above the body
+UP_COLOR = (0, 255, 0)  # Green, body of a bar that closed at or above its open
+DOWN_COLOR = (255, 0, 0)  # Red, body of a bar that closed below its open
+
+# Function to scale prices to integer pixel heights between min_price and max_price, like normalize_data and plot_data do,
+# NaN and inf are drawn at 0. Compact int prices (dataloader.to_compact) are scaled exactly in integers, min-max normalization
+# cancels their price scale so they need no converting back
+def scale_prices(prices, min_price, max_price, height):
+    if is_compact(prices):
+        with np.errstate(invalid='ignore'):
+            min_price = np.asarray(min_price).astype(np.int64)
+            max_price = np.asarray(max_price).astype(np.int64)
+        return (prices - min_price) * (height - 1) // np.maximum(max_price - min_price, 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        normalized = np.where(min_price == max_price, prices - min_price, (prices - min_price) / (max_price - min_price))
+    normalized[~np.isfinite(normalized)] = 0
+    return (normalized * (height - 1)).astype(np.int64)
+
+# Function to get the four price columns as arrays, compact int prices stay int64 and everything else becomes float64
+def price_columns(opens, highs, lows, closes):
+    dtype = np.int64 if all(is_compact(values) for values in (opens, highs, lows, closes)) else np.float64
+    return [np.asarray(values, dtype=dtype) for values in (opens, highs, lows, closes)]
+
+# Function to get the min and max of the four price columns over positions [start, stop), NaN is skipped like pandas does
+def price_range(opens, highs, lows, closes, start, stop):
+    prices = np.concatenate([values[start:stop] for values in (opens, highs, lows, closes)])
+    if not is_compact(prices):
+        prices = prices[~np.isnan(prices)]
+    if len(prices) == 0:
+        return np.nan, np.nan
+    return prices.min(), prices.max()
+
+# Function to scale many windows [starts, stops) of the same columns at once, every window min-max normalized
+# over all four of its prices, returns the scaled prices (4, windows, longest window) and which of those bars are inside their window,
+# bounds are the (min, max) of every window when they are already known, e.g. from a windowindex.RangeIndex.
+# Compact int prices are scaled exactly
+def scale_windows(opens, highs, lows, closes, starts, stops, height, bounds=None):
+    starts = np.asarray(starts)
+    lengths = np.asarray(stops) - starts
+    span = int(lengths.max()) if len(lengths) else 0
+    valid = np.arange(span) < lengths[:, None]
+    positions = np.where(valid, starts[:, None] + np.arange(span), 0)
+
+    # Padding is left out of the min and max, NaN is skipped like pandas does
+    prices = np.stack([values[positions] for values in price_columns(opens, highs, lows, closes)])
+    if bounds is not None:
+        min_price, max_price = (np.asarray(bound, dtype=np.float64) for bound in bounds)
+        return scale_prices(prices, min_price[:, None], max_price[:, None], height), valid
+
+    if is_compact(prices):
+        # Every window has a min and max unless it is empty, and an empty window draws nothing
+        big = np.iinfo(np.int64).max
+        min_price = np.where(valid, prices, big).min(axis=(0, 2), initial=big)
+        max_price = np.where(valid, prices, -big).max(axis=(0, 2), initial=-big)
+        empty = ~valid.any(axis=1)
+        min_price[empty] = 0
+        max_price[empty] = 0
+        return scale_prices(prices, min_price[:, None], max_price[:, None], height), valid
+
+    present = valid & ~np.isnan(prices)
+    min_price = np.where(present, prices, np.inf).min(axis=(0, 2), initial=np.inf)
+    max_price = np.where(present, prices, -np.inf).max(axis=(0, 2), initial=-np.inf)
+    empty = ~present.any(axis=(0, 2))
+    min_price[empty] = np.nan
+    max_price[empty] = np.nan
+
+    return scale_prices(prices, min_price[:, None], max_price[:, None], height), valid
+
+# Function to paint the price levels (bottoms, tops] of many image columns at once, only those pixels are written,
+# level 0 is on row zero_row and higher levels go up, colors is one colour or one per column
+def paint_levels(batch, images, columns, zero_row, bottoms, tops, colors):
+    counts = np.maximum(tops - bottoms, 0)
+    ends = np.cumsum(counts)
+    total = int(ends[-1]) if len(ends) else 0
+    levels = np.repeat(bottoms + 1 - (ends - counts), counts) + np.arange(total)
+
+    colors = np.asarray(colors, dtype=np.uint8)
+    if colors.ndim == 2:
+        colors = np.repeat(colors, counts, axis=0)
+    batch[np.repeat(images, counts), zero_row - levels, np.repeat(columns, counts)] = colors
+
+# Function to paint candles from scaled prices, in the order the per-bar loop of smallchartV3.plot_data draws them,
+# inclusive also paints the Low row and the bottom row of the body like the Image.load() charts (smallchartV2, -UPDOWN)
+def paint_candles(batch, images, columns, scaled, zero_row, inclusive=False):
+    opens, highs, lows, closes = scaled
+    body_low = np.minimum(opens, closes)
+    body_high = np.maximum(opens, closes)
+
+    if inclusive:
+        paint_levels(batch, images, columns, zero_row, lows - 1, np.minimum(highs, body_high), WICK_COLOR)
+        paint_levels(batch, images, columns, zero_row, np.maximum(body_high, lows - 1), highs, UPPER_WICK_COLOR)
+        body_bottoms = body_low - 1
+    else:
+        paint_levels(batch, images, columns, zero_row, lows, highs, WICK_COLOR)
+        paint_levels(batch, images, columns, zero_row, body_high, highs, UPPER_WICK_COLOR)
+        body_bottoms = body_low
+    colors = np.where((closes >= opens)[:, None], UP_COLOR, DOWN_COLOR)
+    paint_levels(batch, images, columns, zero_row, body_bottoms, body_high, colors)
+
+# Function to draw many windows [starts, stops) of the same columns into rows [start_y, start_y + height) of a
+# (N, H, W, 3) batch of images in one vectorized call, bars beyond the image width are not drawn
+def draw_windows(batch, opens, highs, lows, closes, starts, stops, start_y, height, inclusive=False, bounds=None):
+    scaled, valid = scale_windows(opens, highs, lows, closes, starts, stops, height, bounds)
+    bars = min(scaled.shape[2], batch.shape[2])
+    images, columns = np.nonzero(valid[:, :bars])
+    paint_candles(batch, images, columns, scaled[:, images, columns], start_y + height - 1, inclusive)
+    return batch
+
+# Function to scale one window of bars to pixel heights, the whole window normalized like normalize_data, returns (4, bars)
+def scale_window(opens, highs, lows, closes, height):
+    scaled, _ = scale_windows(opens, highs, lows, closes, [0], [len(opens)], height)
+    return scaled[:, 0]
+
+# Function to paint a window scaled by scale_window into rows [start_y, start_y + height) of an (H, W, 3) uint8 image,
+# bars beyond the image width are not drawn
+def paint_window(pixels, scaled, start_y, height, inclusive=False):
+    bars = min(scaled.shape[1], pixels.shape[1])
+    paint_candles(pixels[None], np.zeros(bars, dtype=np.int64), np.arange(bars), scaled[:, :bars], start_y + height - 1, inclusive)
+    return pixels
+
+# Function to draw a window of bars into rows [start_y, start_y + height) of an (H, W, 3) uint8 image,
+# pixel-identical to the per-bar loop of smallchartV3.plot_data: the whole window is normalized, bars beyond the image width are not drawn
+def draw_window(pixels, opens, highs, lows, closes, start_y, height, inclusive=False):
+    return paint_window(pixels, scale_window(opens, highs, lows, closes, height), start_y, height, inclusive)
+
+# Function to get a cleared (count, height, width, 3) batch of images, reusing out when it is big enough
+def chart_batch(count, height, width, out=None):
+    if out is None or len(out) < count or out.shape[1:] != (height, width, 3):
+        out = np.empty((count, height, width, 3), dtype=np.uint8)
+    batch = out[:count]
+    batch[:] = 0
+    return batch
+
+class SlidingPanel:
+    # Draws consecutive windows of the same columns into rows [start_y, start_y + height) of an image that is kept between frames.
+    # When the min and max of the new window are the ones of the last window, every bar still in the window keeps its pixels,
+    # so the image is shifted left and only the new bars are drawn, otherwise the panel is drawn again from scratch.
+    # With a windowindex.RangeIndex of the columns the min and max of a window are looked up instead of scanned
+    def __init__(self, pixels, opens, highs, lows, closes, start_y, height, inclusive=False, index=None):
+        self.pixels = pixels
+        self.columns = price_columns(opens, highs, lows, closes)
+        self.start_y = start_y
+        self.height = height
+        self.inclusive = inclusive
+        self.index = index
+        self.start = None
+        self.drawn = 0
+        self.bounds = None
+        self.full_renders = 0
+        self.shifted_renders = 0
+
+    def _draw(self, start, stop, column):
+        scaled = scale_prices(np.stack([values[start:stop] for values in self.columns]), self.bounds[0], self.bounds[1], self.height)
+        columns = np.arange(column, column + stop - start)
+        paint_candles(self.pixels[None], np.zeros(len(columns), dtype=np.int64), columns, scaled, self.start_y + self.height - 1, self.inclusive)
+
+    def render(self, start, stop):
+        panel = self.pixels[self.start_y:self.start_y + self.height]
+        if self.index is not None:
+            bounds = self.index.bounds(start, stop)
+        else:
+            bounds = price_range(*self.columns, start, stop)
+        drawn = min(stop - start, panel.shape[1])
+
+        # Columns of the last frame that show bars of this window, bars can only have left on the left
+        shift = start - self.start if self.start is not None else -1
+        kept = max(0, min(self.start + self.drawn - start, drawn)) if shift >= 0 else 0
+        same_bounds = self.bounds is not None and bounds[0] == self.bounds[0] and bounds[1] == self.bounds[1]
+
+        if same_bounds and kept > 0:
+            panel[:, :kept] = panel[:, shift:shift + kept]
+            panel[:, kept:] = 0
+            self.shifted_renders += 1
+        else:
+            panel[:] = 0
+            kept = 0
+            self.full_renders += 1
+
+        self.start = start
+        self.drawn = drawn
+        self.bounds = bounds
+        self._draw(start + kept, start + drawn, kept)
+        return self.pixels
@@ -1,21 +1,29 @@
 import os
 import pandas as pd
+from dataloader import load_frame, frame_to_bars, bars_to_frame
+from aggregator import BarAggregator, bar_frame
 
 class RealTimeSimulator:
-    def __init__(self, file_path, split_date):
+    def __init__(self, file_path, split_date, timeframes=()):
         self.split_date = split_date
         self.base_name = os.path.splitext(os.path.basename(file_path))[0]
         self.past_data = pd.DataFrame()
         self.future_data = pd.DataFrame()
+        self.aggregator = BarAggregator(timeframes)
+        self.timeframe_data = {}
         self._load_and_split_data(file_path)
         
     def _load_and_split_data(self, file_path):
         # Load the CSV file
-        df = pd.read_csv(file_path, parse_dates=['Date'], index_col='Date')
+        df = load_frame(file_path, index_col='Date')
         
         # Split the data into past and future based on the split_date
         self.past_data = df[df.index <= self.split_date].copy()
         self.future_data = df[df.index > self.split_date].copy()
+
+        # Closed bars of the higher timeframes so far, the last bar of each may still be forming
+        closed = self.aggregator.seed(frame_to_bars(self.past_data.reset_index()))
+        self.timeframe_data = {timeframe: bars_to_frame(bars, index_col='Date') for timeframe, bars in closed.items()}
         
         print(f'Successfully split the data into past and future data frames.')
     
@@ -29,6 +37,11 @@ class RealTimeSimulator:
             
             # Remove the first row from the future data
             self.future_data = self.future_data.iloc[1:]
+
+            # Update the forming bar of every timeframe, only bars that closed are appended
+            values = [next_line[col].iloc[0] for col in ('Open', 'High', 'Low', 'Close', 'Volume')]
+            for timeframe, bar in self.aggregator.update(next_line.index[0], *values):
+                self.timeframe_data[timeframe] = pd.concat([self.timeframe_data[timeframe], bar_frame(bar)])
             
             print(f'Moved one line from future to past for {self.base_name}')
         else:
@@ -36,3 +49,10 @@ class RealTimeSimulator:
 
     def get_past_data(self, x):
         return self.past_data.tail(x)
+
+    def get_timeframe_data(self, timeframe, x, include_forming=False):
+        data = self.timeframe_data[timeframe].tail(x)
+        bar = self.aggregator.forming_bar(timeframe)
+        if include_forming and bar is not None:
+            data = pd.concat([data, bar_frame(bar)]).tail(x)
+        return data
@@ -0,0 +1,36 @@
+import time
+import numpy as np
+from dataloader import load_bars
+from resampler import resample_bars, resample_bars_pandas, TIMEFRAMES, CONVENTIONS, OHLCV_RULES
+
+# File the resamplers are compared on
+csv_path = 'DATA/EURUSD_C.csv'
+REPEATS = 3  # Best time out of this many runs is reported
+
+# Function to time a resampler, returns the best time and the bars of the last run
+def time_resampler(resampler, bars, minutes, convention):
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        resampled = resampler(bars, minutes, convention)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, resampled
+
+# Function to check that two sets of bars are the same, column by column
+def same_bars(a, b):
+    return list(a) == list(b) and all(np.array_equal(a[col], b[col]) for col in a)
+
+if __name__ == "__main__":
+    bars = load_bars(csv_path, ['Date'] + list(OHLCV_RULES))
+    print(f"{len(bars['Date'])} M5 bars from '{csv_path}'")
+    print(f"{'timeframe':>10} {'convention':>10} {'bars':>8} {'pandas':>10} {'numpy':>10} {'speedup':>8} {'same':>5}")
+
+    for convention in CONVENTIONS:
+        for timeframe, minutes in TIMEFRAMES.items():
+            if minutes == TIMEFRAMES['M5']:
+                continue
+            pandas_time, expected = time_resampler(resample_bars_pandas, bars, minutes, convention)
+            numpy_time, resampled = time_resampler(resample_bars, bars, minutes, convention)
+            print(f"{timeframe:>10} {convention:>10} {len(resampled['Date']):>8} {pandas_time:>9.4f}s {numpy_time:>9.4f}s "
+                  f"{pandas_time / numpy_time:>7.1f}x {str(same_bars(expected, resampled)):>5}")
@@ -0,0 +1,207 @@
+import numpy as np
+from pandas.tseries.frequencies import to_offset
+from dataloader import load_bars, load_compact_bars, read_bar_cache, write_bar_cache, bars_to_frame, frame_to_bars, to_minutes, price_scale, symbol_of, COMPACT_VARIANT
+
+# Timeframe of the cleaned files, the bottom of the pyramid
+BASE_TIMEFRAME = 'M5'
+
+# Timeframes of the pyramid in minutes, each level is built from the one before it so every timeframe must divide the next
+TIMEFRAMES = {
+    'M5': 5,
+    'M15': 15,
+    'H1': 60,
+    'H4': 240,
+    'D1': 1440,
+}
+
+# Bin edge convention, used both for the side a bar is closed on and for the time it is labelled with:
+# 'left' = a bar covers [t, t + timeframe) and is labelled t (the pandas default),
+# 'right' = a bar covers (t - timeframe, t] and is labelled t (AniCharts)
+CONVENTIONS = ('left', 'right')
+CONVENTION = 'left'
+
+# How every column of a bar is aggregated
+OHLCV_RULES = {
+    'Open': 'first',
+    'High': 'max',
+    'Low': 'min',
+    'Close': 'last',
+    'Volume': 'sum',
+}
+
+# pandas resample rules of the pyramid timeframes, for scripts configured with a rule string
+TIMEFRAME_ALIASES = {
+    '5T': 'M5', '5min': 'M5',
+    '15T': 'M15', '15min': 'M15',
+    'h': 'H1', '1h': 'H1', '1H': 'H1', '60T': 'H1', '60min': 'H1',
+    '4h': 'H4', '4H': 'H4', '240T': 'H4', '240min': 'H4',
+    'D': 'D1', '1D': 'D1', '1d': 'D1',
+}
+
+# Function to get the pyramid timeframe of a timeframe name or pandas rule, None when it is not in the pyramid
+def timeframe_of(rule):
+    if rule in TIMEFRAMES:
+        return rule
+    return TIMEFRAME_ALIASES.get(rule)
+
+# Function to get the length of a fixed pandas resample rule in minutes, None for calendar rules like 'ME' or 'W'
+def rule_minutes(rule):
+    try:
+        nanos = to_offset(rule).nanos
+    except ValueError:
+        return None
+    minutes, rest = divmod(nanos, 60 * 10**9)
+    return minutes if minutes > 0 and rest == 0 else None
+
+# Function to get the cache variant a level is stored under, e.g. 'H1', 'H1.right' or 'H1.compact'
+def pyramid_variant(timeframe, convention=CONVENTION, compact=False):
+    if convention not in CONVENTIONS:
+        raise ValueError(f"Unknown bin edge convention '{convention}', use one of {CONVENTIONS}")
+    variant = timeframe if convention == 'left' else f'{timeframe}.{convention}'
+    return f'{variant}.{COMPACT_VARIANT}' if compact else variant
+
+# Function to find the bins of sorted timestamps in minutes, returns the label of every bin and the index of its first bar
+def bin_edges(minutes, bin_minutes, convention=CONVENTION):
+    # Bins are counted from midnight of the first day, like the default origin of pandas
+    origin = minutes[0] // 1440 * 1440
+    offset = minutes - origin
+    if convention == 'left':
+        bins = offset // bin_minutes
+    else:
+        bins = -(-offset // bin_minutes)
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    labels = origin + bins[starts] * bin_minutes
+    return labels, starts
+
+# Function to aggregate one column over the bins starting at starts, NaN is skipped like pandas does
+def aggregate(values, starts, rule):
+    values = np.asarray(values)
+    missing = np.isnan(values) if values.dtype.kind == 'f' else None
+    if missing is not None and not missing.any():
+        missing = None
+
+    if rule == 'max':
+        return np.fmax.reduceat(values, starts)
+    if rule == 'min':
+        return np.fmin.reduceat(values, starts)
+    if rule == 'sum':
+        return np.add.reduceat(values if missing is None else np.where(missing, 0, values), starts)
+
+    if missing is None:
+        positions = starts if rule == 'first' else np.r_[starts[1:], len(values)] - 1
+        return values[positions]
+
+    # First or last bar of each bin that has a value, NaN for bins without one
+    index = np.arange(len(values))
+    if rule == 'first':
+        positions = np.minimum.reduceat(np.where(missing, len(values), index), starts)
+    else:
+        positions = np.maximum.reduceat(np.where(missing, -1, index), starts)
+    empty = (positions < 0) | (positions >= len(values))
+    result = values[np.clip(positions, 0, len(values) - 1)]
+    result[empty] = np.nan
+    return result
+
+# Function to aggregate bars into bars of a coarser timeframe in one vectorized pass, bins without bars are dropped,
+# gives the same bars as resample_bars_pandas. Compact bars stay compact: int minutes in, int minutes out
+def resample_bars(bars, minutes, convention=CONVENTION):
+    if convention not in CONVENTIONS:
+        raise ValueError(f"Unknown bin edge convention '{convention}', use one of {CONVENTIONS}")
+    rules = {col: rule for col, rule in OHLCV_RULES.items() if col in bars}
+    date_type = np.asarray(bars['Date']).dtype
+    date_type = np.dtype('datetime64[m]') if date_type.kind == 'M' else date_type
+
+    dates = to_minutes(bars['Date'])
+    order = None
+    if len(dates) > 1 and (np.diff(dates) < 0).any():
+        order = np.argsort(dates, kind='stable')
+        dates = dates[order]
+    if len(dates) == 0:
+        return {'Date': dates.astype(date_type), **{col: np.asarray(bars[col])[:0] for col in rules}}
+
+    labels, starts = bin_edges(dates, minutes, convention)
+    resampled = {'Date': labels.astype(date_type)}
+    for col, rule in rules.items():
+        values = np.asarray(bars[col])
+        resampled[col] = aggregate(values if order is None else values[order], starts, rule)
+
+    # Bins where a price had no value at all, like the .dropna() after a pandas resample
+    keep = np.ones(len(labels), dtype=bool)
+    for col in rules:
+        if resampled[col].dtype.kind == 'f':
+            keep &= ~np.isnan(resampled[col])
+    if not keep.all():
+        resampled = {col: values[keep] for col, values in resampled.items()}
+    return resampled
+
+# Function to aggregate bars with pandas resample, the reference resample_bars is checked and benchmarked against
+def resample_bars_pandas(bars, minutes, convention=CONVENTION):
+    frame = bars_to_frame(bars, index_col='Date')
+    rules = {col: rule for col, rule in OHLCV_RULES.items() if col in frame}
+    resampled = frame.resample(f'{minutes}min', label=convention, closed=convention).agg(rules).dropna()
+    return frame_to_bars(resampled.reset_index())
+
+# Function to build the levels of the pyramid, each from the one below it, and store them next to the binary cache,
+# with compact the levels are built from the compact bars and stay in the compact form
+def build_pyramid(csv_path, timeframes=None, convention=CONVENTION, compact=False):
+    timeframes = sorted(timeframes or TIMEFRAMES, key=TIMEFRAMES.get)
+    extra = {}
+    if compact:
+        level, scale = load_compact_bars(csv_path, ['Date'] + list(OHLCV_RULES))
+        extra['scale'] = scale
+    else:
+        level = load_bars(csv_path, ['Date'] + list(OHLCV_RULES))
+
+    levels = {}
+    for timeframe in timeframes:
+        if TIMEFRAMES[timeframe] <= TIMEFRAMES[BASE_TIMEFRAME]:
+            continue
+        level = resample_bars(level, TIMEFRAMES[timeframe], convention)
+        levels[timeframe] = level
+        try:
+            write_bar_cache(csv_path, level, pyramid_variant(timeframe, convention, compact), timeframe=timeframe, convention=convention, **extra)
+        except OSError as e:
+            print(f"Could not write the {timeframe} bar cache for '{csv_path}': {e}")
+    return levels
+
+# Function to load one level of the pyramid, building the pyramid when the level is missing or stale
+def load_timeframe(csv_path, timeframe, usecols=None, mmap_mode=None, convention=CONVENTION):
+    if timeframe not in TIMEFRAMES:
+        raise ValueError(f"Unknown timeframe '{timeframe}', use one of {list(TIMEFRAMES)}")
+
+    # The base level is the cleaned file itself, a base bar is its own bin under either convention
+    if timeframe == BASE_TIMEFRAME:
+        return load_bars(csv_path, usecols, mmap_mode)
+
+    bars = read_bar_cache(csv_path, usecols, mmap_mode, pyramid_variant(timeframe, convention))
+    if bars is not None:
+        return bars
+
+    bars = build_pyramid(csv_path, convention=convention)[timeframe]
+    if usecols is not None:
+        bars = {col: values for col, values in bars.items() if col in usecols}
+    return bars
+
+# Function to load one level of the pyramid in the compact form and its price scale, like load_compact_bars does for the base level
+def load_compact_timeframe(csv_path, timeframe, usecols=None, mmap_mode=None, convention=CONVENTION):
+    if timeframe not in TIMEFRAMES:
+        raise ValueError(f"Unknown timeframe '{timeframe}', use one of {list(TIMEFRAMES)}")
+    if timeframe == BASE_TIMEFRAME:
+        return load_compact_bars(csv_path, usecols, mmap_mode)
+
+    scale = price_scale(symbol_of(csv_path))
+    bars = read_bar_cache(csv_path, usecols, mmap_mode, pyramid_variant(timeframe, convention, compact=True))
+    if bars is not None:
+        return bars, scale
+
+    bars = build_pyramid(csv_path, convention=convention, compact=True)[timeframe]
+    if usecols is not None:
+        bars = {col: values for col, values in bars.items() if col in usecols}
+    return bars, scale
+
+# Function to load one level of the pyramid as a DataFrame, like load_frame does for the base level
+def load_timeframe_frame(csv_path, timeframe, usecols=None, index_col=None, convention=CONVENTION):
+    columns = None
+    if usecols is not None:
+        columns = list(usecols) + ([index_col] if index_col is not None and index_col not in usecols else [])
+    return bars_to_frame(load_timeframe(csv_path, timeframe, columns, convention=convention), usecols, index_col)
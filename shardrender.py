@@ -0,0 +1,106 @@
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from dataloader import load_bars
+from resampler import load_timeframe
+from windowindex import window_bounds, price_range_index
+from rasterizer import SlidingPanel
+from dataset import FrameWriter, merge_shards
+from labels import future_labels
+from frameplanner import chart_frames, bar_features, plan_frames, plan_counts
+from dataquality import load_gap_map
+
+# Chart settings, the same layout as smallchartV3
+CSV_PATH = 'DATA/EURUSD_C.csv'
+START_END_DATE = '2000-02-01 00:00:00'  # Start date and time
+NUM_BARS = 500  # Number of bars to display
+H1_HEIGHT = 250  # Height of H1 chart in pixels
+M5_HEIGHT = 150  # Height of M5 chart in pixels
+TOTAL_HEIGHT = H1_HEIGHT + M5_HEIGHT
+FUTURE_BARS = 4  # Number of bars to look ahead for price prediction
+PRICE_CHANGE_THRESHOLD = 0.005  # 0.5% change threshold
+
+# Frame planning like smallchartV3, None everywhere renders every frame
+TARGET_RATIOS = None  # Class ratios of the rendered frames, e.g. {'UP': 1, 'DOWN': 1, 'NEUTRAL': 1}
+FRAME_COUNT = None  # Frames to render, None for as many as the ratios allow
+FRAME_FILTER = None  # Predicate on frameplanner.bar_features
+SKIP_GAP_FRAMES = False  # Skip frames whose chart has missing bars that are not weekend closes (needs the quality check of 1DataClean)
+
+# Parallel settings, every shard is a consecutive range of H1 bars rendered by one worker into its own dataset directory
+WORKERS = os.cpu_count()
+SHARDS_PER_WORKER = 4  # More shards than workers so a slow shard does not hold up the end
+DATASET_DIR = 'DATA/TEST1FRAMES'
+SHARD_DIR_NAME = 'shard-{:04d}'
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close']
+
+# Function to split sorted bar positions into shards of consecutive positions of about the same size
+def split_shards(positions, shards):
+    return [shard for shard in np.array_split(positions, max(min(shards, len(positions)), 1)) if len(shard)]
+
+# Function to render the frames of the sorted H1 bar positions with their labels into a dataset shard, run in a worker process.
+# The bars are memory-mapped from the binary cache, so every worker shares the same pages instead of reading the CSV
+def render_shard(csv_path, shard_dir, positions, labels):
+    h1 = load_timeframe(csv_path, 'H1', ['Date'] + PRICE_COLUMNS, mmap_mode='r')
+    m5 = load_bars(csv_path, ['Date'] + PRICE_COLUMNS, mmap_mode='r')
+    start, stop = int(positions[0]), int(positions[-1]) + 1
+    h1_dates = np.asarray(h1['Date'][start:stop])
+    m5_starts, m5_stops = window_bounds(m5['Date'], h1_dates, 5 * NUM_BARS, include_start=True)
+
+    # Only the bars the windows of this shard reach are copied out of the maps
+    h1_first = start - NUM_BARS + 1
+    m5_first = int(m5_starts.min()) if len(m5_starts) else 0
+    m5_last = int(m5_stops.max()) if len(m5_stops) else 0
+    h1_prices = [np.asarray(h1[col][h1_first:stop], dtype=np.float64) for col in PRICE_COLUMNS]
+    m5_prices = [np.asarray(m5[col][m5_first:m5_last], dtype=np.float64) for col in PRICE_COLUMNS]
+
+    frame_pixels = np.zeros((TOTAL_HEIGHT, NUM_BARS, 3), dtype=np.uint8)
+    h1_panel = SlidingPanel(frame_pixels, *h1_prices, 0, H1_HEIGHT, index=price_range_index(*h1_prices, max_span=NUM_BARS))
+    m5_panel = SlidingPanel(frame_pixels, *m5_prices, H1_HEIGHT, M5_HEIGHT, index=price_range_index(*m5_prices, max_span=NUM_BARS + 1))
+
+    with FrameWriter(shard_dir, len(positions), TOTAL_HEIGHT, NUM_BARS) as writer:
+        for offset, label in zip(np.asarray(positions) - start, labels):
+            h1_panel.render(offset, offset + NUM_BARS)
+            m5_panel.render(m5_starts[offset] - m5_first, m5_stops[offset] - m5_first)
+            writer.write(frame_pixels, label, h1_dates[offset])
+    return shard_dir, writer.count
+
+# Function to render the frames of every H1 bar from start_date on, or the ones the frame planner picks,
+# with a pool of workers and merge the shard indexes
+def generate_charts(csv_path, output_dir, start_date, workers=WORKERS):
+    # Build the caches once here, the workers only map them
+    h1 = load_timeframe(csv_path, 'H1', ['Date', 'Close'])
+    h1_dates = np.asarray(h1['Date'])
+    m5_dates = load_bars(csv_path, ['Date'])['Date']
+    h1_labels = future_labels(h1['Close'], FUTURE_BARS, PRICE_CHANGE_THRESHOLD, 'max_change_first')
+
+    # Same frames as smallchartV3: full H1 and M5 windows, FUTURE_BARS hours of future data
+    m5_gaps = None
+    if SKIP_GAP_FRAMES:
+        m5_gaps = load_gap_map(csv_path, weekends=False)
+        if m5_gaps is None:
+            raise ValueError(f"No gap map for '{csv_path}', run 1DataClean with CHECK_QUALITY first")
+    end_date = h1_dates[-1] - np.timedelta64(FUTURE_BARS, 'h')
+    candidates = chart_frames(h1_dates, m5_dates, start_date, NUM_BARS, m5_gaps) & (h1_dates <= end_date)
+    features = bar_features(h1_dates, h1['Close']) if FRAME_FILTER else None
+    positions = plan_frames(h1_labels, candidates, features, TARGET_RATIOS, FRAME_COUNT, FRAME_FILTER)
+    print(f"Planned {len(positions)} frames: {plan_counts(h1_labels, positions)}")
+
+    shards = split_shards(positions, workers * SHARDS_PER_WORKER)
+    shard_dirs = [os.path.join(output_dir, SHARD_DIR_NAME.format(shard)) for shard in range(len(shards))]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(render_shard, csv_path, shard_dir, shard, h1_labels[shard]) for shard_dir, shard in zip(shard_dirs, shards)]
+        count = 0
+        for future in futures:
+            shard_dir, shard_count = future.result()
+            count += shard_count
+            print(f"Finished {shard_dir}: {shard_count} frames")
+
+    merge_shards(output_dir, shard_dirs)
+    return count
+
+if __name__ == "__main__":
+    started = time.perf_counter()
+    count = generate_charts(CSV_PATH, DATASET_DIR, START_END_DATE)
+    elapsed = time.perf_counter() - started
+    print(f"Chart generation complete. {count} frames in {elapsed:.1f}s with {WORKERS} workers, {count / elapsed:.0f} frames/s")
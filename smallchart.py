@@ -2,6 +2,8 @@ import pandas as pd
 import numpy as np
 from PIL import Image
 import os
+from dataloader import load_frame
+from resampler import load_timeframe_frame
 
 NUM_BARS = 500
 H1_HEIGHT = 100
@@ -11,15 +13,10 @@ START_FRAME = 90000
 
 os.makedirs('DATA/TEST1IMAGES', exist_ok=True)
 
-df_5min = pd.read_csv('DATA/EURUSD_C.csv', parse_dates=['Date'], usecols=['Date', 'Open', 'High', 'Low', 'Close'])
+df_5min = load_frame('DATA/EURUSD_C.csv', usecols=['Date', 'Open', 'High', 'Low', 'Close'])
 
-# Calculate H1 data for the entire dataset
-df_1hour = df_5min.resample('h', on='Date').agg({
-    'Open': 'first',
-    'High': 'max',
-    'Low': 'min',
-    'Close': 'last'
-}).dropna()
+# H1 data for the entire dataset, precomputed from M5 by the bar pyramid
+df_1hour = load_timeframe_frame('DATA/EURUSD_C.csv', 'H1', usecols=['Open', 'High', 'Low', 'Close'], index_col='Date')
 
 def normalize_data(df):
     price_columns = ['Open', 'High', 'Low', 'Close']
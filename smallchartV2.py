@@ -1,6 +1,10 @@
 import os
 import pandas as pd
+import numpy as np
 from PIL import Image
+from dataloader import frame_to_bars, bars_to_frame, load_frame
+from resampler import resample_bars
+from rasterizer import draw_window
 
 # Custom variables
 NUM_BARS = 500  # Number of bars to display
@@ -14,36 +18,10 @@ output_dir = 'DATA/TEST1IMAGES'
 os.makedirs(output_dir, exist_ok=True)
 
 # Read the CSV file
-df_5min = pd.read_csv('DATA/EURUSD_C.csv', parse_dates=['Date'], usecols=['Date', 'Open', 'Close', 'High', 'Low'])
-
-def normalize_data(df):
-    price_data = df[['Open', 'Close', 'High', 'Low']]
-    min_price = price_data.min().min()
-    max_price = price_data.max().max()
-    return (price_data - min_price) / (max_price - min_price)
+df_5min = load_frame('DATA/EURUSD_C.csv', usecols=['Date', 'Open', 'Close', 'High', 'Low'])
 
 def plot_data(df, start_y, height):
-    normalized_df = normalize_data(df)
-    for i, (_, row) in enumerate(normalized_df.iterrows()):
-        open_price = int(row['Open'] * (height - 1))
-        close_price = int(row['Close'] * (height - 1))
-        high_price = int(row['High'] * (height - 1))
-        low_price = int(row['Low'] * (height - 1))
-
-        color = (0, 255, 0) if close_price >= open_price else (255, 0, 0)
-
-        # Plot high-low line
-        for y in range(low_price, high_price + 1):
-            if y <= close_price or y <= open_price:
-                pixels[i, start_y + height - 1 - y] = (255, 255, 0)  # Yellow for low prices
-            else:
-                pixels[i, start_y + height - 1 - y] = (0, 0, 255)  # Blue for high prices
-
-        # Plot open-close bar
-        start = min(open_price, close_price)
-        end = max(open_price, close_price)
-        for y in range(start, end + 1):
-            pixels[i, start_y + height - 1 - y] = color
+    draw_window(pixels, df['Open'].to_numpy(), df['High'].to_numpy(), df['Low'].to_numpy(), df['Close'].to_numpy(), start_y, height, inclusive=True)
 
 # Loop through the dataframe in 5-minute intervals and generate images
 current_end_time = pd.to_datetime(END_DATE)
@@ -53,16 +31,10 @@ while True:
     if df_5min_window.empty:
         break
 
-    df_1hour_window = df_5min_window.resample('h', on='Date').agg({
-        'Open': 'first',
-        'Close': 'last',
-        'High': 'max',
-        'Low': 'min'
-    }).dropna().tail(NUM_BARS)
+    df_1hour_window = bars_to_frame(resample_bars(frame_to_bars(df_5min_window), 60), index_col='Date').tail(NUM_BARS)
 
     # Create a new image with black background
-    img = Image.new('RGB', (NUM_BARS, TOTAL_HEIGHT), color='black')
-    pixels = img.load()
+    pixels = np.zeros((TOTAL_HEIGHT, NUM_BARS, 3), dtype=np.uint8)
 
     # Plot H1 data
     plot_data(df_1hour_window, 0, H1_HEIGHT)
@@ -70,6 +42,8 @@ while True:
     # Plot M5 data
     plot_data(df_5min_window, H1_HEIGHT, M5_HEIGHT)
 
+    img = Image.fromarray(pixels)
+
     # Save the image
     image_path = os.path.join(output_dir, f'forex_chart_{current_end_time.strftime("%Y%m%d_%H%M%S")}.png')
     img.save(image_path)
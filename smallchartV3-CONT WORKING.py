@@ -2,7 +2,14 @@ import pandas as pd
 import numpy as np
 from PIL import Image
 import os
+import io
 from datetime import datetime, timedelta
+from dataloader import load_frame
+from resampler import load_timeframe_frame
+from rasterizer import scale_window, paint_window
+from dataset import FrameWriter
+from labels import future_labels, LABEL_NAMES
+from pipeline import run_pipeline
 
 # Custom variables
 START_END_DATE = '2000-02-01 00:00:00'  # Start date and time
@@ -13,79 +20,32 @@ TOTAL_HEIGHT = H1_HEIGHT + M5_HEIGHT
 FUTURE_BARS = 4  # Number of bars to look ahead for price prediction
 PRICE_CHANGE_THRESHOLD = 0.005  # 0.5% change threshold
 
+# 'png' saves one image per frame, 'dataset' writes every frame into one memory-mapped file with a label and timestamp index
+OUTPUT_MODE = 'png'
+
+# Pipeline settings: window, normalize and rasterize run in the main thread, PNG encoding and writing in their own threads
+ENCODE_THREADS = 4
+WRITE_THREADS = 2
+QUEUE_SIZE = 32  # Frames each threaded stage holds at most
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close']
+
 # Create directory for images if it doesn't exist
 OUTPUT_DIR = 'DATA/TEST1IMAGES'
+DATASET_DIR = 'DATA/TEST1FRAMES'
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 # Read the CSV file
-df_5min = pd.read_csv('DATA/EURUSD_C.csv', parse_dates=['Date'], usecols=['Date', 'Open', 'Close', 'High', 'Low'])
-df_5min.set_index('Date', inplace=True)
+df_5min = load_frame('DATA/EURUSD_C.csv', usecols=['Date', 'Open', 'Close', 'High', 'Low'], index_col='Date')
 
 # Clean the data
 df_5min = df_5min.dropna()  # Remove rows with NaN values
 df_5min = df_5min.replace([np.inf, -np.inf], np.nan).dropna()  # Remove rows with inf values
 
-# Convert to H1 timeframe once
-df_1hour = df_5min.resample('h').agg({
-    'Open': 'first',
-    'Close': 'last',
-    'High': 'max',
-    'Low': 'min'
-}).dropna()
-
-def normalize_data(df):
-    price_data = df[['Open', 'Close', 'High', 'Low']]
-    min_price = price_data.min().min()
-    max_price = price_data.max().max()
-    normalized = (price_data - min_price) / (max_price - min_price)
-    return normalized.fillna(0).replace([np.inf, -np.inf], 0)  # Replace NaN and inf with 0
-
-def plot_data(df, start_y, height, pixels):
-    normalized_df = normalize_data(df)
-    img_slice = np.zeros((height, NUM_BARS, 3), dtype=np.uint8)
-    
-    # Ensure we don't exceed the available data
-    num_bars = min(NUM_BARS, len(normalized_df))
-    
-    for col in ['Open', 'Close', 'High', 'Low']:
-        normalized_df[col] = (normalized_df[col] * (height - 1)).clip(0, height - 1).astype(int)
-    
-    for i in range(num_bars):
-        low, high = normalized_df['Low'].iloc[i], normalized_df['High'].iloc[i]
-        open_, close = normalized_df['Open'].iloc[i], normalized_df['Close'].iloc[i]
-        
-        # Plot high-low line
-        img_slice[height - 1 - high:height - 1 - low, i] = [255, 255, 0]  # Yellow
-        
-        # Overwrite with blue for high prices
-        blue_start = max(close, open_)
-        img_slice[height - 1 - high:height - 1 - blue_start, i] = [0, 0, 255]  # Blue
-        
-        # Plot open-close bar
-        color = [0, 255, 0] if close >= open_ else [255, 0, 0]  # Green or Red
-        start, end = min(open_, close), max(open_, close)
-        img_slice[height - 1 - end:height - 1 - start, i] = color
-    
-    pixels[start_y:start_y+height, :num_bars] = img_slice[:, :num_bars]
-
-def check_future_price(df, current_index):
-    if current_index + FUTURE_BARS >= len(df):
-        return 'END_OF_DATA'
-    
-    current_price = df.iloc[current_index]['Close']
-    future_prices = df.iloc[current_index + 1 : current_index + FUTURE_BARS + 1]['Close']
-    
-    max_change = (future_prices.max() / current_price) - 1
-    min_change = (future_prices.min() / current_price) - 1
-    
-    if max_change > PRICE_CHANGE_THRESHOLD:
-        print("UP")
-        return 'UP'
-    elif min_change < -PRICE_CHANGE_THRESHOLD:
-        print("DOWN")
-        return 'DOWN'
-    else:
-        return 'NEUTRAL'
+# H1 timeframe, precomputed from M5 by the bar pyramid
+df_1hour = load_timeframe_frame('DATA/EURUSD_C.csv', 'H1', usecols=['Open', 'Close', 'High', 'Low'], index_col='Date')
+
+# Price direction of every H1 bar: UP when a close of the next FUTURE_BARS bars rose more than the threshold, else DOWN when one fell more
+h1_labels = future_labels(df_1hour['Close'].to_numpy(), FUTURE_BARS, PRICE_CHANGE_THRESHOLD, 'max_change_first')
 
 start_date = pd.to_datetime(START_END_DATE)
 end_date = df_1hour.index[-1] - timedelta(hours=FUTURE_BARS)
@@ -97,55 +57,91 @@ if start_index == len(df_1hour):
 
 up_count, down_count, neutral_count = 0, 0, 0
 
-# Initialize the 5-minute window
-m5_start_time = df_1hour.index[start_index] - timedelta(minutes=5*NUM_BARS)
-m5_end_time = df_1hour.index[start_index]
-df_5min_window = df_5min.loc[m5_start_time:m5_end_time]
+writer = FrameWriter(DATASET_DIR, len(df_1hour) - start_index, TOTAL_HEIGHT, NUM_BARS) if OUTPUT_MODE == 'dataset' else None
 
-for current_index in range(start_index, len(df_1hour) - FUTURE_BARS):
-    current_time = df_1hour.index[current_index]
-    
-    if current_time > end_date:
-        break
+# Function to yield the H1 and M5 windows of every frame with its price direction, the first stage of the pipeline
+def frame_windows():
+    global up_count, down_count, neutral_count
 
-    if current_index < NUM_BARS:
-        continue
+    # Initialize the 5-minute window
+    m5_start_time = df_1hour.index[start_index] - timedelta(minutes=5*NUM_BARS)
+    m5_end_time = df_1hour.index[start_index]
+    df_5min_window = df_5min.loc[m5_start_time:m5_end_time]
 
-    # Check future price movement
-    price_direction = check_future_price(df_1hour, current_index)
+    for current_index in range(start_index, len(df_1hour) - FUTURE_BARS):
+        current_time = df_1hour.index[current_index]
+        
+        if current_time > end_date:
+            break
 
-    if price_direction == 'UP':
-        up_count += 1
-    elif price_direction == 'DOWN':
-        down_count += 1
-    else:
-        neutral_count += 1
+        if current_index < NUM_BARS:
+            continue
 
-    # Create a new image with black background
-    pixels = np.zeros((TOTAL_HEIGHT, NUM_BARS, 3), dtype=np.uint8)
+        # Future price movement
+        price_direction = LABEL_NAMES[h1_labels[current_index]]
 
-    # Plot H1 data
-    h1_data = df_1hour.iloc[current_index-NUM_BARS+1:current_index+1]
-    plot_data(h1_data, 0, H1_HEIGHT, pixels)
+        if price_direction == 'UP':
+            up_count += 1
+        elif price_direction == 'DOWN':
+            down_count += 1
+        else:
+            neutral_count += 1
 
-    # Update 5-minute window
-    m5_end_time = current_time
-    m5_start_time = m5_end_time - timedelta(minutes=5*NUM_BARS)
-    new_m5_data = df_5min.loc[df_5min_window.index[-1]:m5_end_time]
-    df_5min_window = pd.concat([df_5min_window, new_m5_data]).iloc[-NUM_BARS:]
+        # H1 data
+        h1_data = df_1hour.iloc[current_index-NUM_BARS+1:current_index+1]
 
-    # Plot M5 data
-    plot_data(df_5min_window, H1_HEIGHT, M5_HEIGHT, pixels)
+        # Update 5-minute window
+        m5_end_time = current_time
+        m5_start_time = m5_end_time - timedelta(minutes=5*NUM_BARS)
+        new_m5_data = df_5min.loc[df_5min_window.index[-1]:m5_end_time]
+        df_5min_window = pd.concat([df_5min_window, new_m5_data]).iloc[-NUM_BARS:]
 
-    # Convert numpy array to PIL Image
-    img = Image.fromarray(pixels)
+        yield {'time': current_time, 'direction': price_direction, 'h1': h1_data, 'm5': df_5min_window}
 
-    # Save the image with a unique filename including the price direction
-    timestamp = current_time.strftime("%Y%m%d_%H%M%S")
-    image_path = os.path.join(OUTPUT_DIR, f'forex_chart_{timestamp}_{price_direction}.png')
-    img.save(image_path)
+        if (up_count + down_count + neutral_count) % 100 == 0:
+            print(f"Processed: {current_time}, UP: {up_count}, DOWN: {down_count}, NEUTRAL: {neutral_count}")
 
-    if (up_count + down_count + neutral_count) % 100 == 0:
-        print(f"Processed: {current_time}, UP: {up_count}, DOWN: {down_count}, NEUTRAL: {neutral_count}")
+# Function to scale the prices of both windows to pixel heights
+def normalize(frame):
+    frame['h1'] = scale_window(*(frame['h1'][col].to_numpy() for col in PRICE_COLUMNS), H1_HEIGHT)
+    frame['m5'] = scale_window(*(frame['m5'][col].to_numpy() for col in PRICE_COLUMNS), M5_HEIGHT)
+    return frame
+
+# Function to draw the H1 and M5 charts into a new image with black background
+def rasterize(frame):
+    pixels = np.zeros((TOTAL_HEIGHT, NUM_BARS, 3), dtype=np.uint8)
+    paint_window(pixels, frame.pop('h1'), 0, H1_HEIGHT)
+    paint_window(pixels, frame.pop('m5'), H1_HEIGHT, M5_HEIGHT)
+    frame['pixels'] = pixels
+    return frame
+
+# Function to encode the image as PNG, run in threads since zlib releases the GIL
+def encode(frame):
+    buffer = io.BytesIO()
+    Image.fromarray(frame.pop('pixels')).save(buffer, format='PNG')
+    frame['png'] = buffer.getvalue()
+    return frame
+
+# Function to save the PNG with a unique filename including the price direction
+def write_png(frame):
+    timestamp = frame['time'].strftime("%Y%m%d_%H%M%S")
+    image_path = os.path.join(OUTPUT_DIR, f'forex_chart_{timestamp}_{frame["direction"]}.png')
+    with open(image_path, 'wb') as f:
+        f.write(frame.pop('png'))
+    return frame
+
+# Function to add the image to the frame dataset, one thread so frames stay in order
+def write_dataset(frame):
+    writer.write(frame.pop('pixels'), frame['direction'], frame['time'])
+    return frame
+
+if writer is not None:
+    stages = [(normalize, 0), (rasterize, 0), (write_dataset, 1)]
+else:
+    stages = [(normalize, 0), (rasterize, 0), (encode, ENCODE_THREADS), (write_png, WRITE_THREADS)]
+run_pipeline(frame_windows(), stages, QUEUE_SIZE)
+
+if writer is not None:
+    writer.close()
 
 print(f"Chart generation complete. Final counts - UP: {up_count}, DOWN: {down_count}, NEUTRAL: {neutral_count}")
\ No newline at end of file
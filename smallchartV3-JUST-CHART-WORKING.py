@@ -1,5 +1,9 @@
 import pandas as pd
+import numpy as np
 from PIL import Image
+from dataloader import frame_to_bars, bars_to_frame, load_frame
+from resampler import resample_bars
+from rasterizer import draw_window
 
 # Custom variables
 START_END_DATE = '2000-02-01 00:00:00'  # Start date and time
@@ -9,61 +13,36 @@ M5_HEIGHT = 150  # Height of M5 chart in pixels
 TOTAL_HEIGHT = H1_HEIGHT + M5_HEIGHT
 
 # Read the CSV file
-df_5min = pd.read_csv('DATA/EURUSD_C.csv', parse_dates=['Date'], usecols=['Date', 'Open', 'Close', 'High', 'Low'])
-
-def normalize_data(df):
-    price_data = df[['Open', 'Close', 'High', 'Low']]
-    min_price = price_data.min().min()
-    max_price = price_data.max().max()
-    return (price_data - min_price) / (max_price - min_price)
+df_5min = load_frame('DATA/EURUSD_C.csv', usecols=['Date', 'Open', 'Close', 'High', 'Low'])
 
 def plot_data(df, start_y, height):
-    normalized_df = normalize_data(df)
-    for i, (_, row) in enumerate(normalized_df.iterrows()):
-        open_price = int(row['Open'] * (height - 1))
-        close_price = int(row['Close'] * (height - 1))
-        high_price = int(row['High'] * (height - 1))
-        low_price = int(row['Low'] * (height - 1))
-
-        color = (0, 255, 0) if close_price >= open_price else (255, 0, 0)
-
-        # Plot high-low line
-        for y in range(low_price, high_price + 1):
-            if y <= close_price or y <= open_price:
-                pixels[i, start_y + height - 1 - y] = (255, 255, 0)  # Yellow for low prices
-            else:
-                pixels[i, start_y + height - 1 - y] = (0, 0, 255)  # Blue for high prices
-
-        # Plot open-close bar
-        start = min(open_price, close_price)
-        end = max(open_price, close_price)
-        for y in range(start, end + 1):
-            pixels[i, start_y + height - 1 - y] = color
+    draw_window(pixels, df['Open'].to_numpy(), df['High'].to_numpy(), df['Low'].to_numpy(), df['Close'].to_numpy(), start_y, height, inclusive=True)
 
 
 current_end_time = pd.to_datetime(START_END_DATE)
 
 last_date = df_5min['Date'].max()
 
+# M5 columns and the H1 bins of the entire dataset, so each frame only resamples the M5 bars of its own H1 bins
+m5_bars = frame_to_bars(df_5min)
+h1_labels = resample_bars(m5_bars, 60)['Date']
+
 while current_end_time <= last_date:
     # Filter the data based on the end date and time
-    df_5min_window = df_5min[df_5min['Date'] <= current_end_time]
+    end = np.datetime64(current_end_time, 'm')
+    stop = np.searchsorted(m5_bars['Date'], end, side='right')
 
-    # Convert to H1 timeframe
-    df_1hour_window = df_5min_window.resample('h', on='Date').agg({
-        'Open': 'first',
-        'Close': 'last',
-        'High': 'max',
-        'Low': 'min'
-    }).dropna()
+    # Convert to H1 timeframe, the last bin before the end time may be empty so one extra bin is resampled
+    first_bin = np.searchsorted(h1_labels, end, side='right') - NUM_BARS - 1
+    start = np.searchsorted(m5_bars['Date'], h1_labels[first_bin]) if first_bin > 0 else 0
+    df_1hour_window = bars_to_frame(resample_bars({col: values[start:stop] for col, values in m5_bars.items()}, 60), index_col='Date')
 
     # Select the last NUM_BARS rows for each dataframe
     df_1hour_window = df_1hour_window.tail(NUM_BARS)
-    df_5min_window = df_5min_window.tail(NUM_BARS)
+    df_5min_window = df_5min.iloc[max(0, stop - NUM_BARS):stop]
 
     # Create a new image with black background
-    img = Image.new('RGB', (NUM_BARS, TOTAL_HEIGHT), color='black')
-    pixels = img.load()
+    pixels = np.zeros((TOTAL_HEIGHT, NUM_BARS, 3), dtype=np.uint8)
 
     # Plot H1 data
     plot_data(df_1hour_window, 0, H1_HEIGHT)
@@ -71,6 +50,8 @@ while current_end_time <= last_date:
     # Plot M5 data
     plot_data(df_5min_window, H1_HEIGHT, M5_HEIGHT)
 
+    img = Image.fromarray(pixels)
+
     # Save the image with a unique filename
     image_path = f'DATA/TEST1IMAGES/forex_chart_{current_end_time.strftime("%Y%m%d_%H%M%S")}.png'
     img.save(image_path)
@@ -1,5 +1,10 @@
 import pandas as pd
+import numpy as np
 from PIL import Image
+from dataloader import load_frame
+from resampler import load_timeframe_frame
+from rasterizer import draw_window
+from labels import future_labels, LABEL_NAMES
 
 # Custom variables
 START_END_DATE = '2001-06-16 07:25:00'  # Start date and time
@@ -12,47 +17,19 @@ FUTURE_BARS = 4  # Number of future bars to look ahead
 PRICE_CHANGE_THRESHOLD = 0.005  # Threshold for price change (percentage)
 
 # Read the CSV file
-df_5min = pd.read_csv('DATA/EURUSD_C.csv', parse_dates=['Date'], usecols=['Date', 'Open', 'Close', 'High', 'Low'])
-
-def normalize_data(df):
-    price_data = df[['Open', 'Close', 'High', 'Low']]
-    min_price = price_data.min().min()
-    max_price = price_data.max().max()
-    return (price_data - min_price) / (max_price - min_price)
+df_5min = load_frame('DATA/EURUSD_C.csv', usecols=['Date', 'Open', 'Close', 'High', 'Low'])
 
 def plot_data(df, start_y, height):
-    normalized_df = normalize_data(df)
-    for i, (_, row) in enumerate(normalized_df.iterrows()):
-        open_price = int(row['Open'] * (height - 1))
-        close_price = int(row['Close'] * (height - 1))
-        high_price = int(row['High'] * (height - 1))
-        low_price = int(row['Low'] * (height - 1))
-
-        color = (0, 255, 0) if close_price >= open_price else (255, 0, 0)
-
-        # Plot high-low line
-        for y in range(low_price, high_price + 1):
-            if y <= close_price or y <= open_price:
-                pixels[i, start_y + height - 1 - y] = (255, 255, 0)  # Yellow for low prices
-            else:
-                pixels[i, start_y + height - 1 - y] = (0, 0, 255)  # Blue for high prices
-
-        # Plot open-close bar
-        start = min(open_price, close_price)
-        end = max(open_price, close_price)
-        for y in range(start, end + 1):
-            pixels[i, start_y + height - 1 - y] = color
+    draw_window(pixels, df['Open'].to_numpy(), df['High'].to_numpy(), df['Low'].to_numpy(), df['Close'].to_numpy(), start_y, height, inclusive=True)
 
 current_end_time = pd.to_datetime(START_END_DATE)
 last_date = df_5min['Date'].max()
 
-# Convert the entire dataset to H1 timeframe once
-df_1hour = df_5min.resample('h', on='Date').agg({
-    'Open': 'first',
-    'Close': 'last',
-    'High': 'max',
-    'Low': 'min'
-}).dropna()
+# H1 timeframe of the entire dataset, precomputed from M5 by the bar pyramid
+df_1hour = load_timeframe_frame('DATA/EURUSD_C.csv', 'H1', usecols=['Open', 'Close', 'High', 'Low'], index_col='Date')
+
+# Direction of every H1 bar from the first of the next FUTURE_BARS closes that moved more than the threshold
+h1_labels = future_labels(df_1hour['Close'].to_numpy(), FUTURE_BARS, PRICE_CHANGE_THRESHOLD, 'first_crossing')
 
 while current_end_time <= last_date:
     # Filter the data based on the end date and time
@@ -64,8 +41,7 @@ while current_end_time <= last_date:
     df_5min_window = df_5min_window.tail(NUM_BARS)
 
     # Create a new image with black background
-    img = Image.new('RGB', (NUM_BARS, TOTAL_HEIGHT), color='black')
-    pixels = img.load()
+    pixels = np.zeros((TOTAL_HEIGHT, NUM_BARS, 3), dtype=np.uint8)
 
     # Plot H1 data
     plot_data(df_1hour_window, 0, H1_HEIGHT)
@@ -73,21 +49,12 @@ while current_end_time <= last_date:
     # Plot M5 data
     plot_data(df_5min_window, H1_HEIGHT, M5_HEIGHT)
 
-    # Look at future bars
-    current_close = df_1hour_window.iloc[-1]['Close']
-    future_df = df_1hour[df_1hour.index > current_end_time].head(FUTURE_BARS)
-    
-    price_direction = 'NEUTRAL'
-    for _, future_row in future_df.iterrows():
-        price_change = (future_row['Close'] - current_close) / current_close
-        if abs(price_change) > PRICE_CHANGE_THRESHOLD:
-            if price_change > 0:
-                price_direction = 'UP'
-                print('UP')
-            else:
-                price_direction = 'DOWN'
-                print('DOWN')
-            break
+    # Look at future bars after the last H1 bar of the window
+    price_direction = LABEL_NAMES[h1_labels[df_1hour.index.searchsorted(current_end_time, side='right') - 1]]
+    if price_direction != 'NEUTRAL':
+        print(price_direction)
+
+    img = Image.fromarray(pixels)
 
     # Save the image with a unique filename
     image_path = f'DATA/TEST1IMAGES/forex_chart_{current_end_time.strftime("%Y%m%d_%H%M%S")}_{price_direction}.png'
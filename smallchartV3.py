@@ -3,6 +3,13 @@ import numpy as np
 from PIL import Image
 import os
 from datetime import datetime, timedelta
+from dataloader import load_frame
+from resampler import load_timeframe_frame
+from windowindex import window_bounds, price_range_index
+from rasterizer import chart_batch, draw_windows, SlidingPanel
+from labels import future_labels, triple_barrier_labels, LABEL_NAMES
+from frameplanner import chart_frames, bar_features, plan_frames
+from dataquality import load_gap_map
 
 # Custom variables
 START_END_DATE = '2000-02-01 00:00:00'  # Start date and time
@@ -12,74 +19,32 @@ M5_HEIGHT = 150  # Height of M5 chart in pixels
 TOTAL_HEIGHT = H1_HEIGHT + M5_HEIGHT
 FUTURE_BARS = 4  # Number of bars to look ahead for price prediction
 PRICE_CHANGE_THRESHOLD = 0.005  # 0.5% change threshold
+LABEL_RULE = 'max_change_first'  # 'max_change_first' on the closes, or 'triple_barrier' on the High/Low path
+
+# Frame planning, frames are picked from the labels before rendering, None everywhere renders every frame
+TARGET_RATIOS = None  # Class ratios of the rendered frames, e.g. {'UP': 1, 'DOWN': 1, 'NEUTRAL': 1}
+FRAME_COUNT = None  # Frames to render, None for as many as the ratios allow
+FRAME_FILTER = None  # Predicate on frameplanner.bar_features, e.g. lambda features: features['Session'] != 'LATE'
+SKIP_GAP_FRAMES = False  # Skip frames whose chart has missing bars that are not weekend closes (needs the quality check of 1DataClean)
+BATCH_SIZE = 256  # Number of frames rendered together
+INCREMENTAL_RENDER = True  # Reuse the last frame when the window only slid, otherwise render batches
 
 # Create directory for images if it doesn't exist
 OUTPUT_DIR = 'DATA/TEST1IMAGES'
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 # Read the CSV file
-df_5min = pd.read_csv('DATA/EURUSD_C.csv', parse_dates=['Date'], usecols=['Date', 'Open', 'Close', 'High', 'Low'])
-df_5min.set_index('Date', inplace=True)
-
-# Convert to H1 timeframe
-df_1hour = df_5min.resample('h').agg({
-    'Open': 'first',
-    'Close': 'last',
-    'High': 'max',
-    'Low': 'min'
-}).dropna()
-
-def normalize_data(df):
-    price_data = df[['Open', 'Close', 'High', 'Low']]
-    min_price = price_data.min().min()
-    max_price = price_data.max().max()
-    if min_price == max_price:
-        return price_data - min_price
-    return (price_data - min_price) / (max_price - min_price)
-
-def plot_data(df, start_y, height, pixels):
-    normalized_df = normalize_data(df)
-    normalized_df = normalized_df.replace([np.inf, -np.inf, np.nan], 0)
-    
-    opens = (normalized_df['Open'] * (height - 1)).astype(int)
-    closes = (normalized_df['Close'] * (height - 1)).astype(int)
-    highs = (normalized_df['High'] * (height - 1)).astype(int)
-    lows = (normalized_df['Low'] * (height - 1)).astype(int)
-    
-    for i in range(min(NUM_BARS, len(normalized_df))):
-        low, high = lows.iloc[i], highs.iloc[i]
-        open_, close = opens.iloc[i], closes.iloc[i]
-        
-        # Plot high-low line
-        pixels[start_y + height - 1 - high:start_y + height - 1 - low, i] = [255, 255, 0]  # Yellow
-        
-        # Overwrite with blue for high prices
-        blue_start = max(close, open_)
-        pixels[start_y + height - 1 - high:start_y + height - 1 - blue_start, i] = [0, 0, 255]  # Blue
-        
-        # Plot open-close bar
-        color = [0, 255, 0] if close >= open_ else [255, 0, 0]  # Green or Red
-        start, end = min(open_, close), max(open_, close)
-        pixels[start_y + height - 1 - end:start_y + height - 1 - start, i] = color
-
-def check_future_price(df, current_index):
-    if current_index + FUTURE_BARS >= len(df):
-        return 'END_OF_DATA'
-    
-    current_price = df.iloc[current_index]['Close']
-    future_prices = df.iloc[current_index + 1 : current_index + FUTURE_BARS + 1]['Close']
-    
-    max_change = (future_prices.max() / current_price) - 1
-    min_change = (future_prices.min() / current_price) - 1
-    
-    if max_change > PRICE_CHANGE_THRESHOLD:
-        print("UP")
-        return 'UP'
-    elif min_change < -PRICE_CHANGE_THRESHOLD:
-        print("DOWN")
-        return 'DOWN'
-    else:
-        return 'NEUTRAL'
+df_5min = load_frame('DATA/EURUSD_C.csv', usecols=['Date', 'Open', 'Close', 'High', 'Low'], index_col='Date')
+
+# H1 timeframe, precomputed from M5 by the bar pyramid
+df_1hour = load_timeframe_frame('DATA/EURUSD_C.csv', 'H1', usecols=['Open', 'Close', 'High', 'Low'], index_col='Date')
+
+# Price direction of every H1 bar: UP when a close of the next FUTURE_BARS bars rose more than the threshold, else DOWN when one fell more,
+# or with triple_barrier the barrier the High/Low path reaches first
+if LABEL_RULE == 'triple_barrier':
+    h1_labels, _, _ = triple_barrier_labels(df_1hour['Close'], df_1hour['High'], df_1hour['Low'], FUTURE_BARS, PRICE_CHANGE_THRESHOLD)
+else:
+    h1_labels = future_labels(df_1hour['Close'].to_numpy(), FUTURE_BARS, PRICE_CHANGE_THRESHOLD, LABEL_RULE)
 
 start_date = pd.to_datetime(START_END_DATE)
 end_date = df_1hour.index[-1] - timedelta(hours=FUTURE_BARS)
@@ -90,6 +55,67 @@ if start_index == len(df_1hour):
 
 up_count, down_count, neutral_count = 0, 0, 0
 
+# Bars picked by the frame planner, the others are skipped without rendering
+planned = None
+if TARGET_RATIOS or FRAME_COUNT or FRAME_FILTER or SKIP_GAP_FRAMES:
+    m5_gaps = None
+    if SKIP_GAP_FRAMES:
+        m5_gaps = load_gap_map('DATA/EURUSD_C.csv', weekends=False)
+        if m5_gaps is None:
+            raise ValueError("No gap map for 'DATA/EURUSD_C.csv', run 1DataClean with CHECK_QUALITY first")
+    candidates = chart_frames(df_1hour.index, df_5min.index, START_END_DATE, NUM_BARS, m5_gaps) & (df_1hour.index <= end_date)
+    positions = plan_frames(h1_labels, candidates, bar_features(df_1hour.index, df_1hour['Close']), TARGET_RATIOS, FRAME_COUNT, FRAME_FILTER)
+    planned = np.zeros(len(df_1hour), dtype=bool)
+    planned[positions] = True
+    print(f"Planned {len(positions)} frames")
+
+# Positions of the M5 bars from 5*NUM_BARS minutes before each H1 bar up to it, so every frame is a positional slice
+m5_starts, m5_stops = window_bounds(df_5min.index, df_1hour.index, 5 * NUM_BARS, include_start=True)
+
+# Price columns the windows are drawn from, and one image buffer reused by every batch
+h1_prices = [df_1hour[col].to_numpy() for col in ['Open', 'High', 'Low', 'Close']]
+m5_prices = [df_5min[col].to_numpy() for col in ['Open', 'High', 'Low', 'Close']]
+
+# Min and max price of any window up to NUM_BARS + 1 bars, so windows are normalized without scanning them
+h1_index = price_range_index(*h1_prices, max_span=NUM_BARS + 1)
+m5_index = price_range_index(*m5_prices, max_span=NUM_BARS + 1)
+batch_buffer = np.empty((BATCH_SIZE, TOTAL_HEIGHT, NUM_BARS, 3), dtype=np.uint8)
+
+# One image kept between frames, its H1 and M5 panels are shifted while their price range does not change
+frame_pixels = np.zeros((TOTAL_HEIGHT, NUM_BARS, 3), dtype=np.uint8)
+h1_panel = SlidingPanel(frame_pixels, *h1_prices, 0, H1_HEIGHT, index=h1_index)
+m5_panel = SlidingPanel(frame_pixels, *m5_prices, H1_HEIGHT, M5_HEIGHT, index=m5_index)
+
+# Function to render a frame from the image of the frame before it
+def render_incremental(current_index):
+    h1_panel.render(current_index - NUM_BARS + 1, current_index + 1)
+    m5_panel.render(m5_starts[current_index], m5_stops[current_index])
+    return frame_pixels
+
+# Function to render a list of (H1 bar position, price direction) frames and save the images
+def render_frames(frames):
+    if INCREMENTAL_RENDER:
+        images = (render_incremental(current_index) for current_index, _ in frames)
+    else:
+        indexes = np.array([current_index for current_index, _ in frames])
+        images = chart_batch(len(frames), TOTAL_HEIGHT, NUM_BARS, batch_buffer)
+
+        # Plot H1 and M5 data of every frame at once
+        h1_starts, h1_stops = indexes - NUM_BARS + 1, indexes + 1
+        draw_windows(images, *h1_prices, h1_starts, h1_stops, 0, H1_HEIGHT, bounds=h1_index.bounds(h1_starts, h1_stops))
+        draw_windows(images, *m5_prices, m5_starts[indexes], m5_stops[indexes], H1_HEIGHT, M5_HEIGHT,
+                     bounds=m5_index.bounds(m5_starts[indexes], m5_stops[indexes]))
+
+    for pixels, (current_index, price_direction) in zip(images, frames):
+        # Convert numpy array to PIL Image
+        img = Image.fromarray(pixels)
+
+        # Save the image
+        timestamp = df_1hour.index[current_index].strftime("%Y%m%d_%H%M%S")
+        image_path = os.path.join(OUTPUT_DIR, f'forex_chart_{timestamp}_{price_direction}.png')
+        # img.save(image_path)
+
+frames = []
 for current_index in range(start_index, len(df_1hour) - FUTURE_BARS):
     current_time = df_1hour.index[current_index]
     
@@ -99,8 +125,11 @@ for current_index in range(start_index, len(df_1hour) - FUTURE_BARS):
     if current_index < NUM_BARS:
         continue
 
-    # Check future price movement using H1 data
-    price_direction = check_future_price(df_1hour, current_index)
+    if planned is not None and not planned[current_index]:
+        continue
+
+    # Future price movement using H1 data
+    price_direction = LABEL_NAMES[h1_labels[current_index]]
 
     if price_direction == 'UP':
         up_count += 1
@@ -109,34 +138,22 @@ for current_index in range(start_index, len(df_1hour) - FUTURE_BARS):
     else:
         neutral_count += 1
 
-    # Create a new image with black background
-    pixels = np.zeros((TOTAL_HEIGHT, NUM_BARS, 3), dtype=np.uint8)
-
-    # Plot H1 data
-    h1_data = df_1hour.iloc[current_index-NUM_BARS+1:current_index+1]
-    if len(h1_data) < NUM_BARS:
+    # Check the H1 and M5 windows, the frame is rendered with the next batch
+    if current_index + 1 < NUM_BARS:
         print(f"Skipping {current_time}: Not enough H1 data")
         continue
-    plot_data(h1_data, 0, H1_HEIGHT, pixels)
-
-    # Plot M5 data
-    m5_end_time = current_time
-    m5_start_time = m5_end_time - timedelta(minutes=5*NUM_BARS)
-    df_5min_window = df_5min.loc[m5_start_time:m5_end_time]
-    if len(df_5min_window) < NUM_BARS:
+    if m5_stops[current_index] - m5_starts[current_index] < NUM_BARS:
         print(f"Skipping {current_time}: Not enough M5 data")
         continue
-    plot_data(df_5min_window, H1_HEIGHT, M5_HEIGHT, pixels)
-
-    # Convert numpy array to PIL Image
-    img = Image.fromarray(pixels)
-
-    # Save the image
-    timestamp = current_time.strftime("%Y%m%d_%H%M%S")
-    image_path = os.path.join(OUTPUT_DIR, f'forex_chart_{timestamp}_{price_direction}.png')
-    # img.save(image_path)
+    frames.append((current_index, price_direction))
+    if len(frames) == BATCH_SIZE:
+        render_frames(frames)
+        frames = []
 
     if (up_count + down_count + neutral_count) % 100 == 0:
         print(f"Processed: {current_time}, UP: {up_count}, DOWN: {down_count}, NEUTRAL: {neutral_count}")
 
+if frames:
+    render_frames(frames)
+
 print(f"Chart generation complete. Final counts - UP: {up_count}, DOWN: {down_count}, NEUTRAL: {neutral_count}")
\ No newline at end of file
@@ -0,0 +1,60 @@
+import numpy as np
+from dataloader import to_minutes
+
+# Function to get the positions [start, stop) of the bars inside the time windows ending at each end time, all at once,
+# windows are (end - span, end] like a boolean mask with > and <=, or [end - span, end] like a .loc slice with include_start
+def window_bounds(dates, ends, span_minutes, include_start=False):
+    minutes = to_minutes(dates)
+    ends = to_minutes(ends)
+    starts = np.searchsorted(minutes, ends - span_minutes, side='left' if include_start else 'right')
+    stops = np.searchsorted(minutes, ends, side='right')
+    return starts, stops
+
+class SparseTable:
+    # Range minimum or maximum of values over any positions [start, stop) in O(1): level k holds the result of every run of 2**k values,
+    # a window is covered by the two runs of the longest length that fits in it. Levels are only built up to windows of max_span values
+    def __init__(self, values, reduce, max_span=None):
+        values = np.asarray(values, dtype=np.float64)
+        max_span = len(values) if max_span is None else min(max_span, len(values))
+        self.reduce = reduce
+        self.table = np.empty((max(max_span, 1).bit_length(), len(values)))
+        self.table[0] = values
+        for level in range(1, len(self.table)):
+            half = 1 << (level - 1)
+            self.table[level] = self.table[level - 1]
+            reduce(self.table[level - 1][:-half], self.table[level - 1][half:], out=self.table[level][:-half])
+
+    def query(self, starts, stops):
+        # NaN is skipped like pandas does, NaN for windows without values
+        starts = np.asarray(starts)
+        lengths = np.asarray(stops) - starts
+        levels = np.frexp(np.maximum(lengths, 1))[1] - 1
+        if (levels >= len(self.table)).any():
+            raise ValueError(f"Window of {lengths.max()} bars is longer than the {(1 << len(self.table)) - 1} bars the index was built for")
+        if self.table.shape[1] == 0:
+            return np.full(lengths.shape, np.nan)[()]
+        last = self.table.shape[1] - 1
+        first = self.table[levels, np.minimum(starts, last)]
+        second = self.table[levels, np.clip(starts + lengths - (1 << levels), 0, last)]
+        return np.where(lengths > 0, self.reduce(first, second), np.nan)[()]
+
+class RangeIndex:
+    # Lowest low, highest high and highest volume of any window of bars, computed once per timeframe instead of scanning every frame
+    def __init__(self, lows, highs, volumes=None, max_span=None):
+        self.lows = SparseTable(lows, np.fmin, max_span)
+        self.highs = SparseTable(highs, np.fmax, max_span)
+        self.volumes = SparseTable(volumes, np.fmax, max_span) if volumes is not None else None
+
+    def bounds(self, starts, stops):
+        return self.lows.query(starts, stops), self.highs.query(starts, stops)
+
+    def volume_max(self, starts, stops):
+        return self.volumes.query(starts, stops)
+
+# Function to build the range index of the four prices of every bar, its bounds are the min and max of Open, High, Low and Close
+# of the window like normalize_data uses, which are the lowest Low and highest High unless a bar is broken
+def price_range_index(opens, highs, lows, closes, volumes=None, max_span=None):
+    prices = [np.asarray(values, dtype=np.float64) for values in (opens, highs, lows, closes)]
+    bar_lows = np.fmin(np.fmin(prices[0], prices[1]), np.fmin(prices[2], prices[3]))
+    bar_highs = np.fmax(np.fmax(prices[0], prices[1]), np.fmax(prices[2], prices[3]))
+    return RangeIndex(bar_lows, bar_highs, volumes, max_span)